@@ -1,11 +1,24 @@
-import urllib.request
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import csv
+import dataclasses
+import threading
 import time
 from datetime import datetime, timedelta, timezone
 import os
-from urllib.parse import urlparse
-import socket  #check p3p源 rtp源
-import subprocess #check rtmp源
+import sys
+from urllib.parse import urlparse, urlsplit, urlunsplit
+
+# 仓库根目录加入搜索路径，复用根目录下的公共模块（与main.py共用）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from channel_names import CORRECTIONS_FILE, ChannelNameNormalizer, load_corrections_name
+from dns_cache import DNSCache
+from fetch_cache import FetchCache
+from playlist_parser import PlaylistStreamParser, SourceExpander
+from prober import AsyncProber, CheckedSource, CheckResult, ProbeResult
+from probe_history import MIN_TIMEOUT_SAMPLES, ProbeHistory, adaptive_timeout, percentile
+from host_health import HostHealth
+from ffprobe_scheduler import DEFAULT_CACHE_FILE as DEFAULT_FFPROBE_CACHE_FILE, FFprobeScheduler
+from run_metrics import CHECK_METRICS_FILE, RunMetrics, probe_metrics
 
 timestart = datetime.now()
 
@@ -35,254 +48,369 @@ def read_txt_file(file_path):
         ]
     return lines
 
-# 检测URL是否可访问并记录响应时间
-def check_url(url, timeout=6):
-    start_time = time.time()
-    elapsed_time = None
-    success = False
-
-    # 将 URL 中的汉字编码
-    encoded_url = urllib.parse.quote(url, safe=':/?&=')
-    
+# 每个频道只需要 TOP_K 个低于延迟门限的源（main.py 只保留最快的前5个），达标后其余检测取消
+TOP_K = 5
+LATENCY_CUTOFF_MS = 2000
+
+# 频道名归一化，用于按频道分组：与 main.py 排名时用的规范名一致（繁转简、removal_list 清理、corrections_name.txt 纠正）
+name_normalizer = ChannelNameNormalizer(load_corrections_name(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), CORRECTIONS_FILE)))
+
+def normalize_channel_name(name):
+    return name_normalizer.normalize(name)
+
+# 读取上一次 whitelist_auto.txt 中的响应时间 {url: ms}，用于确定检测优先级
+def read_history_latency(file_path):
+    history = {}
+    for line in read_txt_to_array(file_path):
+        parts = line.split(',')
+        if len(parts) >= 3 and parts[0].endswith('ms'):
+            try:
+                history[parts[2].strip()] = float(parts[0][:-2])
+            except ValueError:
+                continue
+    return history
+
+# 读取清单文件第二行的更新时间（北京时间，如 "20250926 00:27,url"），返回时间戳
+def read_list_version_time(file_path):
+    lines = read_txt_to_array(file_path)
+    if len(lines) < 2:
+        return None
     try:
-        if url.startswith("http"):
-            headers = {
-                'User-Agent': 'PostmanRuntime-ApipostRuntime/1.1.0',
-            }
-            req = urllib.request.Request(encoded_url, headers=headers)
-            with urllib.request.urlopen(req, timeout=timeout) as response:
-                if response.status == 200:
-                    success = True
-        elif url.startswith("p3p"):
-            success = check_p3p_url(url, timeout)
-        elif url.startswith("p2p"):
-            success = check_p2p_url(url, timeout)        
-        elif url.startswith("rtmp") or url.startswith("rtsp") :
-            success = check_rtmp_url(url, timeout)
-        elif url.startswith("rtp"):
-            success = check_rtp_url(url, timeout)
-
-        # 如果执行到这一步，没有异常，计算时间
-        elapsed_time = (time.time() - start_time) * 1000  # 转换为毫秒
-
-    except Exception as e:
-        print(f"Error checking {url}: {e}")
-        record_host(get_host_from_url(url))
-        # 在发生异常的情况下，将 elapsed_time 设置为 None
-        elapsed_time = None
-
-    return elapsed_time, success
-
-def check_rtmp_url(url, timeout):
-    try:
-        result = subprocess.run(['ffprobe', url], stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
-        if result.returncode == 0:
-            return True
-    except subprocess.TimeoutExpired:
-        print(f"Timeout checking {url}")
-    except Exception as e:
-        print(f"Error checking {url}: {e}")
-    return False
+        version = datetime.strptime(lines[1].split(',')[0], "%Y%m%d %H:%M")
+        return version.replace(tzinfo=timezone(timedelta(hours=8))).timestamp()
+    except ValueError:
+        return None
+
+# 增量检测：只重新检测新URL、结果超过 RECHECK_TTL_HOURS 的URL、以及最近失败且超过 FAILED_TTL_HOURS 的URL
+# 其余URL沿用历史库（probe_history.db）或上一次 whitelist_auto.txt 中仍新鲜的结果
+INCREMENTAL = os.environ.get('CHECK_INCREMENTAL', '1') == '1'
+RECHECK_TTL_HOURS = float(os.environ.get('RECHECK_TTL_HOURS', '24'))
+FAILED_TTL_HOURS = float(os.environ.get('FAILED_TTL_HOURS', '2'))
+
+# 拆分为需检测的行、沿用的成功结果（"XXms,频道,url"）、沿用的黑名单行，
+# 以及历史库中没有、从 whitelist_auto.txt 沿用的 (url, ms)：调用方须以 previous_time 记入历史库，
+# 否则 whitelist_auto.txt 每次重写都刷新时间，这些URL永远不会被重新检测
+def partition_incremental(lines, whitelist, url_stats, previous_latency, previous_time, now):
+    to_probe = []
+    carried_success = []
+    carried_black = []
+    seeded = []
+    ttl = RECHECK_TTL_HOURS * 3600
+    failed_ttl = FAILED_TTL_HOURS * 3600
+    for line in lines:
+        line = line.strip()
+        parts = line.split(',')
+        url = parts[1] if len(parts) == 2 else None
+        stats = url_stats.get(url)
+        if url is None or url in whitelist:
+            to_probe.append(line)
+        elif stats is not None:
+            age = now - stats.last_ts
+            if stats.last_success and stats.ewma_ms is not None and age < ttl:
+                carried_success.append(f"{stats.ewma_ms:.2f}ms,{line}")
+            elif not stats.last_success and age < failed_ttl:
+                carried_black.append(line)
+            else:
+                to_probe.append(line)
+        elif url in previous_latency and previous_time and now - previous_time < ttl:
+            carried_success.append(f"{previous_latency[url]:.2f}ms,{line}")
+            seeded.append((url, previous_latency[url]))
+        else:
+            to_probe.append(line)
+    return to_probe, carried_success, carried_black, seeded
 
-def check_rtp_url(url, timeout):
-    try:
-        # 解析URL
-        parsed_url = urlparse(url)
-        
-        # 提取主机名（IP地址）和端口号
-        host = parsed_url.hostname
-        port = parsed_url.port
-
-        # 创建一个 socket 连接
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-            s.settimeout(timeout)  # 设置超时时间
-            s.connect((host, port))
-            s.sendto(b'', (host, port))  # 发送空的UDP数据包
-            s.recv(1)  # 尝试接收数据
-        return True
-    except (socket.timeout, socket.error):
-        return False
-
-def check_p3p_url(url, timeout):
-    try:
-        # 解析URL
-        parsed_url = urlparse(url)
-        host = parsed_url.hostname
-        port = parsed_url.port or (80 if parsed_url.scheme == "http" else 443)
-        path = parsed_url.path or "/"
-        
-        # 检查解析是否成功
-        if not host or not port or not path:
-            raise ValueError("Invalid p3p URL")
-
-        # 创建一个 TCP 连接
-        with socket.create_connection((host, port), timeout=timeout) as s:
-            # 发送一个简单的请求（根据协议定义可能需要调整）
-            # request = f"GET {path} P3P/1.0\r\nHost: {host}\r\n\r\n"
-            # 构造请求
-            request = (
-                f"GET {path} P3P/1.0\r\n"
-                f"Host: {host}\r\n"
-                f"User-Agent: CustomClient/1.0\r\n"
-                f"Connection: close\r\n\r\n"
-            )
-            
-            # 读取响应
-            response = s.recv(1024)
-            
-            # 简单判断是否收到有效响应
-            if b"P3P" in response:
-                return True
-    except Exception as e:
-        print(f"Error checking {url}: {e}")
-    return False
+# 按频道分组并排序：白名单优先，其次按历史延迟，最后是没有历史记录的源；各频道轮流出队
+def schedule_probe_order(lines, whitelist, history):
+    groups = {}
+    for line in lines:
+        if "#genre#" in line or "://" not in line:
+            continue
+        parts = line.strip().split(',')
+        if len(parts) != 2:
+            continue
+        groups.setdefault(normalize_channel_name(parts[0]), []).append(line)
 
-def check_p2p_url(url, timeout):
-    try:
-        # 解析URL
-        parsed_url = urlparse(url)
-        host = parsed_url.hostname
-        port = parsed_url.port
-        path = parsed_url.path
-
-        # 检查解析是否成功
-        if not host or not port or not path:
-            raise ValueError("Invalid P2P URL")
-
-        # 创建一个 TCP 连接
-        with socket.create_connection((host, port), timeout=timeout) as s:
-            # 自定义请求，这里只是一个占位符，需根据具体协议定义
-            request = f"YOUR_CUSTOM_REQUEST {path}\r\nHost: {host}\r\n\r\n"
-            s.sendall(request.encode())
-            
-            # 读取响应
-            response = s.recv(1024)
-            
-            # 自定义响应解析，这里简单示例
-            if b"SOME_EXPECTED_RESPONSE" in response:
-                return True
-    except Exception as e:
-        print(f"Error checking {url}: {e}")
-    return False
-
-# 处理单行文本并检测URL
-def process_line(line, whitelist): 
-    if "#genre#" in line or "://" not in line :
-        return None, None  # 跳过包含“#genre#”的行
-    line=line.strip()
-    parts = line.split(',')
-    if len(parts) == 2:
-        name, url = parts
-        # 白名单判断
+    def priority(line):
+        url = line.strip().split(',')[1]
         if url in whitelist:
-            return 0, line
-        # 请求验证
-        elapsed_time, is_valid = check_url(url)
-        if is_valid:
-            return elapsed_time, line
-        else:
-            return None, line
-    return None, None
-
-# 多线程处理文本并检测URL
-def process_urls_multithreaded(lines, whitelist, max_workers=30):
+            return (0, 0, line)
+        if url in history:
+            return (1, history[url], line)
+        return (2, 0, line)
+
+    queues = [(key, sorted(group, key=priority)) for key, group in groups.items()]
+    order = []
+    depth = 0
+    while queues:
+        order.extend((key, group[depth]) for key, group in queues)
+        depth += 1
+        queues = [(key, group) for key, group in queues if len(group) > depth]
+    return order
+
+# 异步检测参数：同时在途的检测数、单个host并发上限、每秒新发起检测数上限、超时（秒）
+MAX_CONCURRENCY = 2000
+PER_HOST_LIMIT = 8
+POOL_PER_HOST = 8  # 每个 host:port 最多保持的 HTTP/1.1 长连接数，同一服务器的检测复用连接免去握手
+POOL_MAX_IDLE = 256  # 所有 host 合计最多保留的空闲长连接数，超出时关闭最久未用的；空闲超过15秒的连接也会被关闭
+RATE_LIMIT = 500
+
+# 自适应超时：按host历史成功延迟的 p99 × 系数，限制在 [TIMEOUT_FLOOR, TIMEOUT_CEILING] 秒；无历史的host用较短的 PROBE_TIMEOUT
+PROBE_TIMEOUT = 4
+TIMEOUT_FLOOR = 1.5
+TIMEOUT_CEILING = 15
+# 上游源下载的超时：无历史时 FETCH_TIMEOUT，有历史时同样按 p99 × 系数
+FETCH_TIMEOUT = 10
+FETCH_TIMEOUT_FLOOR = 3
+FETCH_TIMEOUT_CEILING = 30
+
+# 对冲检测：检测超过该host历史p50延迟仍未完成时，并行发起第二次尝试，先成功者为准
+# 额外请求数不超过检测数的 HEDGE_BUDGET（设为0关闭）；第二次尝试新建连接，并占用该host的一个 PER_HOST_LIMIT 名额（名额已满则不对冲）
+HEDGE_BUDGET = float(os.environ.get('CHECK_HEDGE_BUDGET', '0.05'))
+
+# 主机熔断：连续失败达到门限的host先只检测 CANARY_COUNT 个探针URL，探针全部失败则该host其余URL不再检测直接判失败
+CANARY_COUNT = 2
+host_health = HostHealth()  # .cache/host_health.json，不提交到仓库，由 actions/cache 跨运行保留
+
+# rtmp/rtsp 的 ffprobe 检测：限制同时运行的进程数，成功结果（编码、分辨率、码率）缓存在 .cache/ffprobe_cache.json，
+# 不提交到仓库，由 actions/cache 跨运行保留
+ffprobe_scheduler = FFprobeScheduler(DEFAULT_FFPROBE_CACHE_FILE, timeout=PROBE_TIMEOUT)
+
+# 本次检测的原始结果（ProbeResult），运行结束后写入 probe_history.db 和 .cache/probe_results.csv
+probe_results = []
+
+# 异步检测所有URL（http/https、p3p/p2p的TCP、rtp的UDP、rtmp/rtsp的ffprobe）
+# 频道达到 TOP_K 个合格源后取消该频道剩余的检测
+async def probe_urls(lines, whitelist, history, top_k, cutoff_ms, qualified, timeouts, hedge_delays):
     blacklist =  [] 
     successlist = []
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(process_line, line, whitelist): line for line in lines}
-        for future in as_completed(futures):
-            elapsed_time, result = future.result()
-            if result:
-                if elapsed_time is not None:
-                    successlist.append(f"{elapsed_time:.2f}ms,{result}")
-                else:
-                    blacklist.append(result)
+    order = schedule_probe_order(lines, whitelist, history)
+    # 已达标（含沿用结果）的频道无需再检测
+    order = [(key, line) for key, line in order if qualified.get(key, 0) < top_k]
+    pending = {}  # 频道尚未完成的检测
+    skipped = 0
+    circuit_skipped = 0
+    prober = AsyncProber(timeout=PROBE_TIMEOUT, max_concurrency=MAX_CONCURRENCY,
+                         per_host_limit=PER_HOST_LIMIT, rate_limit=RATE_LIMIT, ffprobe=ffprobe_scheduler,
+                         dns=dns_cache, pool_size=POOL_PER_HOST, pool_max_idle=POOL_MAX_IDLE,
+                         timeouts=timeouts, hedge_delays=hedge_delays, hedge_budget=HEDGE_BUDGET)
+
+    # 熔断中的host：按检测顺序取前 CANARY_COUNT 个URL作为探针，其余URL等探针有结果后再决定
+    # 白名单URL不实际检测，不能当探针（否则探针永远不出结果，该host其余URL一直等待）
+    canaries = {}  # {host: {探针行}}
+    for key, line in order:
+        line = line.strip()
+        url = line.split(',')[1]
+        if url in whitelist:
+            continue
+        host = get_host_from_url(url)
+        if host_health.is_open(host):
+            picked = canaries.setdefault(host, set())
+            if len(picked) < CANARY_COUNT:
+                picked.add(line)
+    gates = {host: (set(picked), asyncio.Event()) for host, picked in canaries.items()}  # {host: (未完成探针, 事件)}
+
+    # 探针结束（完成、出错或被取消）时调用，可重复调用；全部探针结束则放行该host其余URL
+    def release_canary(line):
+        host = get_host_from_url(line.split(',')[1])
+        gate = gates.get(host)
+        if gate is not None and line in gate[0]:
+            gate[0].discard(line)
+            if not gate[0]:
+                gate[1].set()
+
+    async def probe_line(line):
+        line = line.strip()
+        try:
+            url = line.split(',')[1]
+            # 白名单判断
+            if url in whitelist:
+                return 0, line
+            host = get_host_from_url(url)
+            gate = gates.get(host)
+            is_canary = gate is not None and line in canaries[host]
+            if gate is not None and not is_canary:
+                await gate[1].wait()
+                if host_health.is_open(host):
+                    nonlocal circuit_skipped
+                    circuit_skipped += 1
+                    return None, line
+            result = await prober.probe(url)
+            host_health.record(host, result.success)
+            if is_canary and result.success:
+                gate[1].set()  # 探针成功，熔断关闭，放行该host其余URL
+            if result.error:
+                print(f"Error checking {url}: {result.error}")
+                record_host(get_host_from_url(url))
+            probe_results.append(result)
+            return (result.elapsed_ms if result.success else None), line
+        finally:
+            release_canary(line)
+
+    def on_done(key, task, line):
+        nonlocal skipped
+        if task.cancelled():
+            # 开始执行前就被取消的任务不会进入 probe_line 的 finally
+            release_canary(line.strip())
+            skipped += 1
+            return
+        elapsed_time, result = task.result()
+        if elapsed_time is not None:
+            successlist.append(f"{elapsed_time:.2f}ms,{result}")
+            if elapsed_time < cutoff_ms:
+                qualified[key] = qualified.get(key, 0) + 1
+                if qualified[key] == top_k:
+                    for other in pending[key]:
+                        other.cancel()
+        else:
+            blacklist.append(result)
+
+    # DNS预解析：所有域名并行解析一次，解析失败（NXDOMAIN）的host其全部URL直接判失败
+    dns_start = time.time()
+    dns_failed = await prober.preresolve(line.strip().split(',')[1] for key, line in order)
+    print(f"DNS预解析: 失败 {dns_failed}, 用时 {time.time() - dns_start:.1f}秒")
+
+    # 第一阶段：所有http(s)端点并行TCP连接，连不上的URL不再发起HTTP请求
+    phase1_start = time.time()
+    await prober.prefilter(line.strip().split(',')[1] for key, line in order)
+    unreachable = sum(1 for result in prober.endpoints.values() if not result.reachable)
+    print(f"第一阶段TCP预检: 端点 {len(prober.endpoints)}, 不可达 {unreachable}, 用时 {time.time() - phase1_start:.1f}秒")
+
+    # 第二阶段：HTTP/HLS等完整检测
+    phase2_start = time.time()
+    tasks = []
+    for key, line in order:
+        task = asyncio.ensure_future(probe_line(line))
+        task.add_done_callback(lambda t, key=key, line=line: on_done(key, t, line))
+        pending.setdefault(key, []).append(task)
+        tasks.append(task)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    prober.close()
+    print(f"第二阶段完整检测用时: {time.time() - phase2_start:.1f}秒")
+    print(f"HTTP连接: 新建 {prober.pool.opened}, 复用 {prober.pool.reused}, 空闲回收 {prober.pool.evicted}")
+    print(f"对冲检测: 第二次尝试 {prober.hedges}/{prober.primaries} (预算 {HEDGE_BUDGET:.0%}), 第二次尝试胜出 {prober.hedge_wins}")
+    print(f"检测数: {len(order) - skipped}, 频道已达标提前取消: {skipped}")
+    print(f"熔断host: {len(canaries)}, 探针失败后跳过检测: {circuit_skipped}")
     return successlist, blacklist
 
+# qualified: 各频道已有的合格源数量（增量模式下沿用的结果），{归一化频道名: 数量}
+def process_urls_async(lines, whitelist, history=None, top_k=TOP_K, cutoff_ms=LATENCY_CUTOFF_MS, qualified=None,
+                       timeouts=None, hedge_delays=None):
+    return asyncio.run(probe_urls(lines, whitelist, history or {}, top_k, cutoff_ms, dict(qualified or {}),
+                                  timeouts or {}, hedge_delays or {}))
+
 # 写入文件
 def write_list(file_path, data_list):
     with open(file_path, 'w', encoding='utf-8') as file:
         for item in data_list:
             file.write(item + '\n')
 
+# 检测明细（每个URL一行，含两阶段各自的用时 connect_ms / elapsed_ms）
+def write_probe_results(file_path, results):
+    columns = [field.name for field in dataclasses.fields(ProbeResult)]
+    with open(file_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for result in sorted(results, key=lambda r: r.url):
+            values = [getattr(result, column) for column in columns]
+            writer.writerow([f"{value:.2f}" if isinstance(value, float) else value for value in values])
+
 # 增加外部url到检测清单，同时支持检测m3u格式url
 # urls里所有的源都读到这里。
 urls_all_lines = []
 
-#M3U格式判断
-def is_m3u_content(text):
-    lines = text.splitlines()
-    first_line = lines[0].strip()
-    return first_line.startswith("#EXTM3U")
+url_statistics=[]
 
-def convert_m3u_to_txt(m3u_content):
-    # 分行处理
-    lines = m3u_content.split('\n')
-    
-    # 用于存储结果的列表
-    txt_lines = []
-    
-    # 临时变量用于存储频道名称
-    channel_name = ""
-    
-    for line in lines:
-        # 过滤掉 #EXTM3U 开头的行
-        if line.startswith("#EXTM3U"):
-            continue
-        # 处理 #EXTINF 开头的行
-        if line.startswith("#EXTINF"):
-            # 获取频道名称
-            channel_name = line.split(',')[-1].strip()
-        # 处理 URL 行
-        elif line.startswith("http"):
-            txt_lines.append(f"{channel_name},{line.strip()}")
+# 进程内DNS缓存（含NXDOMAIN负缓存），上游源下载和直播源检测共用
+dns_cache = DNSCache()
 
-    return txt_lines
+# 上游源条件请求缓存（ETag/Last-Modified），未变化的源直接复用上次的解析结果
+fetch_cache = FetchCache(dns=dns_cache)
 
-url_statistics=[]
+# 每个上游源的下载指标：状态、耗时、字节数、行数、记录数
+upstream_metrics = {}
 
 def process_url(url):
+    upstream = upstream_metrics[url] = {'status': 'failed', 'bytes': 0}
+    start_time = time.perf_counter()
     try:
         # 打开URL并读取内容
         headers = {
             'User-Agent': 'PostmanRuntime-ApipostRuntime/1.1.0',
         }
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=10) as response:
-            # 以二进制方式读取数据
-            data = response.read()
-            # 将二进制数据解码为字符串
-            text = data.decode('utf-8')
-            if is_m3u_content(text):
-                m3u_lines=convert_m3u_to_txt(text)
-                url_statistics.append(f"{len(m3u_lines)},{url.strip()}")
-                urls_all_lines.extend(m3u_lines) # 注意：extend
+        timeout = fetch_cache.timeout_for(url, FETCH_TIMEOUT, FETCH_TIMEOUT_FLOOR, FETCH_TIMEOUT_CEILING)
+        # 边下载边解析（增量解码，按首行识别M3U/TXT），不在内存中保留整个文件
+        parser = PlaylistStreamParser()
+        records = []
+
+        def sink(chunk):
+            upstream['bytes'] += len(chunk)
+            records.extend(parser.feed(chunk))
+
+        result = fetch_cache.fetch(url, headers, timeout=timeout, sink=sink)
+        upstream.update(status='unchanged' if result.from_cache else 'ok',
+                        elapsed_ms=round((time.perf_counter() - start_time) * 1000, 1))
+        parsed = None
+        if result.from_cache:
+            parsed = fetch_cache.get_parsed(url, 'checker', result.sha256)
+            if parsed is None:
+                for chunk in fetch_cache.iter_body(url):
+                    records.extend(parser.feed(chunk))
             else:
-                lines = text.split('\n')
-                url_statistics.append(f"{len(lines)},{url.strip()}")
-                for line in lines:
-                    if  "#genre#" not in line and "," in line and "://" in line:
-                        urls_all_lines.append(line.strip())
+                print(f"源未变化，复用缓存: {url}")
+        if parsed is None:
+            records.extend(parser.close())
+            parsed = {'count': len(records), 'lines': [f"{record.name},{record.url}" for record in records]}
+            fetch_cache.put_parsed(url, 'checker', result.sha256, parsed)
+        url_statistics.append(f"{parsed['count']},{url.strip()}")
+        urls_all_lines.extend(parsed['lines']) # 注意：extend
+        upstream['records'] = parsed['count']
+        if parser.line_count:  # 复用缓存的解析结果时没有重新读行
+            upstream['lines'] = parser.line_count
     
     except Exception as e:
+        upstream.update(error=str(e) or type(e).__name__, elapsed_ms=round((time.perf_counter() - start_time) * 1000, 1))
         print(f"处理URL时发生错误：{e}")
 
 
+DEFAULT_PORTS = {'http': 80, 'https': 443, 'rtmp': 1935, 'rtsp': 554}
+
+# URL规范化（仅作去重键）：scheme和host转小写、去默认端口、query参数排序、去$后缀
+def canonical_url(url):
+    url = url.strip()
+    last_dollar_index = url.rfind('$')
+    if last_dollar_index != -1:
+        url = url[:last_dollar_index]
+    try:
+        parsed = urlsplit(url)
+        scheme = parsed.scheme.lower()
+        host = (parsed.hostname or '').lower()
+        if ':' in host:
+            host = f'[{host}]'  # IPv6
+        port = parsed.port
+    except ValueError:
+        return url
+    netloc = host if port is None or port == DEFAULT_PORTS.get(scheme) else f'{host}:{port}'
+    if parsed.username is not None:
+        userinfo = parsed.netloc.rpartition('@')[0]
+        netloc = f'{userinfo}@{netloc}'
+    query = '&'.join(sorted(parsed.query.split('&'))) if parsed.query else ''
+    return urlunsplit((scheme, netloc, parsed.path, query, parsed.fragment))
+
 # 去重复源 2024-08-06 (检测前剔除重复url，提高检测效率)
+# 按规范化URL哈希去重（O(n)），同一URL无论出现在哪个频道名下只保留第一次出现的行、只检测一次
 def remove_duplicates_url(lines):
-    urls =[]
+    seen = set()
     newlines=[]
     for line in lines:
         if "," in line and "://" in line:
             # channel_name=line.split(',')[0].strip()
-            channel_url=line.split(',')[1].strip()
-            if channel_url not in urls: # 如果发现当前url不在清单中，则假如newlines
-                urls.append(channel_url)
+            key = canonical_url(line.split(',')[1])
+            if key not in seen: # 如果发现当前url不在清单中，则假如newlines
+                seen.add(key)
                 newlines.append(line)
     return newlines
 
-# 处理带$的URL，把$之后的内容都去掉（包括$也去掉） 【2024-08-08 22:29:11】
 #def clean_url(url):
 #    last_dollar_index = url.rfind('$')  # 安全起见找最后一个$处理
 #    if last_dollar_index != -1:
@@ -300,21 +428,18 @@ def clean_url(lines):
     return newlines
 
 # 处理带#的URL  【2024-08-09 23:53:26】
+# 拆分与统计和 main.py 共用 SourceExpander：每个地址作为独立的一行参与去重、检测和排序
+source_expander = SourceExpander()
 def split_url(lines):
     newlines=[]
     for line in lines:
+        if "," not in line:
+            continue
         # 拆分成频道名和URL部分
         channel_name, channel_address = line.split(',', 1)
-        #需要加处理带#号源=予加速源
-        if  "#" not in channel_address:
-            newlines.append(line)
-        elif  "#" in channel_address and "://" in channel_address: 
-            # 如果有“#”号，则根据“#”号分隔
-            url_list = channel_address.split('#')
-            for url in url_list:
-                if "://" in url: 
-                    newline=f'{channel_name},{url}'
-                    newlines.append(line)
+        #需要加处理带#号源=予加速源：根据“#”号分隔
+        for url in source_expander.expand(channel_address):
+            newlines.append(f'{channel_name},{url}')
     return newlines
 
 # 取得host
@@ -325,26 +450,42 @@ def get_host_from_url(url: str) -> str:
     except Exception as e:
         return f"Error: {str(e)}"
 
-# 使用字典来统计blackhost的记录次数
+# 使用字典来统计blackhost的记录次数（加锁，可在工作线程中调用）
 blacklist_dict = {}
+blacklist_dict_lock = threading.Lock()
 def record_host(host):
-    # 如果 host 已经在字典中，计数加 1
-    if host in blacklist_dict:
-        blacklist_dict[host] += 1
-    # 如果 host 不在字典中，加入并初始化计数为 1
-    else:
-        blacklist_dict[host] = 1
+    with blacklist_dict_lock:
+        # 如果 host 已经在字典中，计数加 1
+        if host in blacklist_dict:
+            blacklist_dict[host] += 1
+        # 如果 host 不在字典中，加入并初始化计数为 1
+        else:
+            blacklist_dict[host] = 1
         
-if __name__ == "__main__":
-    # 自定义源
-    urls = read_txt_to_array('assets/urls.txt')
-    # urls = ['https://raw.githubusercontent.com/YanG-1989/m3u/main/Gather.m3u']
-    
+# 下载阶段：读取urls清单中的上游源存入urls_all_lines
+def fetch_sources(urls):
+    run_metrics.begin('fetch')
+    # 预先并行解析所有上游源域名
+    dns_cache.prefetch(urlparse(url).hostname for url in urls if url.startswith("http"))
     for url in urls:
         if url.startswith("http"):
             print(f"处理URL: {url}")
             process_url(url)   #读取上面url清单中直播源存入urls_all_lines
-            
+    fetch_cache.save()
+    run_metrics.end()
+
+# 本次检测的各阶段耗时和统计指标
+run_metrics = RunMetrics()
+
+# 流水线（pipeline.py）已下载并解析好的上游源记录，直接存入urls_all_lines，不再重复下载
+def add_source_records(url, records):
+    url_statistics.append(f"{len(records)},{url.strip()}")
+    urls_all_lines.extend(f"{record.name},{record.url}" for record in records)
+
+# 检测阶段：检测lines中的直播源，写出 whitelist_auto.txt / blacklist_auto.txt 等文件，
+# 同时返回 CheckResult 供流水线在内存中直接交给 main.py
+def run_check(lines):
+    run_metrics.begin('prepare')
     # 获取当前脚本所在的目录
     current_dir = os.path.dirname(os.path.abspath(__file__))
     # 获取上一层目录
@@ -365,7 +506,6 @@ if __name__ == "__main__":
     lines2 = read_txt_file(input_file2)
     lines3 = read_txt_file(input_file3)
     # lines=urls_all_lines + lines1 + lines2 # 从list变成集合提供检索效率⇒发现用了set后加#合并多行url，故去掉
-    lines=urls_all_lines
     
     # 计算合并后合计个数
     urls_hj_before = len(lines)
@@ -373,6 +513,7 @@ if __name__ == "__main__":
     # 分级带#号直播源地址
     lines=split_url(lines)
     lines_whitelist=split_url(lines_whitelist)
+    print(f"多地址源拆分: {source_expander.lines_expanded} 行, 拆出 {source_expander.fragments} 个地址")
 
     # 去$
     lines=clean_url(lines)
@@ -388,9 +529,57 @@ if __name__ == "__main__":
     extracted_parts = [white_line.split(',')[1].strip() if ',' in white_line and len(white_line.split(',')) >= 2 else "" for white_line in lines_whitelist]
     # 再将提取出来的内容构建成集合，利用集合去重等特性（如果有需要的话）
     white_line_parts_set = set(extracted_parts)
+    # 上次检测的响应时间（whitelist_auto.txt 将被本次结果覆盖，先读出来）
+    history_latency = read_history_latency(os.path.join(current_dir, 'whitelist_auto.txt'))
+    history_time = read_list_version_time(os.path.join(current_dir, 'whitelist_auto.txt'))
+    probe_history = ProbeHistory()  # .cache/probe_history.db，不提交到仓库，由 actions/cache 跨运行保留
+    # 主机健康记分板，首次运行时用 blackhost_count.txt 的失败次数初始化
+    host_health.seed_from_counts(os.path.join(current_dir, 'blackhost_count.txt'))
+
+    # 增量模式：仍新鲜的结果直接沿用，只检测新增、过期和最近失败的URL
+    lines_to_probe = set(lines)
+    carried_success, carried_black = [], []
+    qualified = {}
+    if INCREMENTAL:
+        lines_to_probe, carried_success, carried_black, seeded = partition_incremental(
+            lines_to_probe, white_line_parts_set, probe_history.stats(), history_latency, history_time, time.time())
+        # 沿用的结果按上次检测的时间记入历史库，过了 RECHECK_TTL_HOURS 即重新检测
+        probe_history.record((url, get_host_from_url(url), history_time, latency, True, 0, None, None, None)
+                             for url, latency in seeded)
+        for item in carried_success:
+            parts = item.split(',')
+            if float(parts[0][:-2]) < LATENCY_CUTOFF_MS:
+                key = normalize_channel_name(parts[1])
+                qualified[key] = qualified.get(key, 0) + 1
+        print(f"增量检测: 待检测 {len(lines_to_probe)}, 沿用成功 {len(carried_success)}, 沿用失败 {len(carried_black)}")
+
     # 处理URL并生成成功清单和黑名单
-    successlist, blacklist = process_urls_multithreaded(set(lines), white_line_parts_set)
+    # 每个host的检测超时和对冲延迟（p50）由历史延迟分布得出
+    host_latencies = probe_history.host_latencies()
+    host_timeouts = {host: adaptive_timeout(latencies, PROBE_TIMEOUT, TIMEOUT_FLOOR, TIMEOUT_CEILING)
+                     for host, latencies in host_latencies.items()}
+    hedge_delays = {host: percentile(sorted(latencies), 0.5) / 1000
+                    for host, latencies in host_latencies.items() if len(latencies) >= MIN_TIMEOUT_SAMPLES}
+    print(f"自适应超时: 有历史的host {len(host_timeouts)}, 其余host默认 {PROBE_TIMEOUT}秒")
+
+    run_metrics.begin('probe')
+
+    successlist, blacklist = process_urls_async(lines_to_probe, white_line_parts_set, history_latency, qualified=qualified,
+                                                timeouts=host_timeouts, hedge_delays=hedge_delays)
+    successlist += carried_success
+    blacklist += carried_black
+
+    run_metrics.begin('history')
+    # 检测结果追加到历史库（EWMA/p50/p95/成功率评分，供 main.py 排序使用；沿用 ffprobe 缓存的结果不重复记录）
+    probe_history.record((result.url, get_host_from_url(result.url), result.ts, result.elapsed_ms,
+                          result.success, result.bytes_read, result.ttfb_ms, result.throughput_kbps,
+                          result.bandwidth_kbps) for result in probe_results if not result.from_cache)
+    probe_history.prune()
+    probe_history.close()
+    host_health.save()
+    ffprobe_scheduler.save()
     
+    run_metrics.begin('write')
     # 给successlist, blacklist排序
     # 定义排序函数
     def successlist_sort_key(item):
@@ -399,6 +588,10 @@ if __name__ == "__main__":
     
     successlist=sorted(successlist, key=successlist_sort_key)
     blacklist=sorted(blacklist)
+    check_result = CheckResult(
+        success=[CheckedSource(float(parts[0][:-2]), parts[1], parts[2].strip())
+                 for parts in (item.split(',', 2) for item in successlist) if len(parts) == 3],
+        blacklist=[item.split(',', 1)[1].strip() for item in blacklist if ',' in item])
 
     # 计算check后ok和ng个数
     urls_ok = len(successlist)
@@ -439,9 +632,15 @@ if __name__ == "__main__":
     # 写入黑名单文件
     write_list(blacklist_file, blacklist)
 
+    # 写入检测明细（放在 .cache 下，不提交到仓库；汇总数据已在 check_metrics.json 里）
+    probe_results_file = os.path.join(parent2_dir, '.cache', 'probe_results.csv')
+    os.makedirs(os.path.dirname(probe_results_file), exist_ok=True)
+    write_probe_results(probe_results_file, probe_results)
+
     print(f"成功清单文件已生成: {success_file}")
     print(f"成功清单文件已生成(tv): {success_file_tv}")
     print(f"黑名单文件已生成: {blacklist_file}")
+    print(f"检测明细文件已生成: {probe_results_file}")
 
     # 执行的代码
     timeend = datetime.now()
@@ -479,3 +678,22 @@ if __name__ == "__main__":
             
     for statistics in url_statistics: #查看各个url的量有多少 2024-08-19
         print(statistics)
+
+    # 本次检测的结构化指标（各阶段耗时/CPU、上游源、按协议和结果分类的检测数、延迟直方图、最慢host），
+    # main.py 会把它并入 live.txt 旁的 metrics.json
+    run_metrics.end()
+    run_metrics.set('upstreams', upstream_metrics)
+    run_metrics.set('lines', {'merged': urls_hj_before, 'deduplicated': urls_hj, 'probed': len(lines_to_probe),
+                              'ok': urls_ok, 'ng': urls_ng})
+    run_metrics.set('probes', probe_metrics(probe_results, get_host_from_url))
+    run_metrics.set('dns', {'hits': dns_cache.hits, 'misses': dns_cache.misses})
+    run_metrics.write(CHECK_METRICS_FILE)
+
+    return check_result
+
+if __name__ == "__main__":
+    # 自定义源
+    urls = read_txt_to_array('assets/urls.txt')
+    # urls = ['https://raw.githubusercontent.com/YanG-1989/m3u/main/Gather.m3u']
+    fetch_sources(urls)
+    run_check(urls_all_lines)
@@ -0,0 +1,168 @@
+import asyncio
+import http.client
+import socket
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DNS_TTL = 300  # Seconds; getaddrinfo does not expose record TTLs, so one TTL applies to every host
+NEGATIVE_TTL = 60  # NXDOMAIN answers are remembered this long
+PREFETCH_WORKERS = 64
+# getaddrinfo errors that mean the name does not exist, as opposed to a transient failure (EAI_AGAIN)
+NEGATIVE_ERRORS = {socket.EAI_NONAME, getattr(socket, 'EAI_NODATA', socket.EAI_NONAME)}
+
+
+def system_resolver(host: str) -> List[str]:
+    """Distinct addresses getaddrinfo returns for host, in its preference order"""
+    return list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)))
+
+
+class DNSCache:
+    """Thread-safe hostname -> address cache with a TTL and negative caching of NXDOMAIN,
+    shared by the playlist fetches and the stream probes"""
+
+    def __init__(self, ttl: float = DNS_TTL, negative_ttl: float = NEGATIVE_TTL,
+                 resolver: Callable[[str], List[str]] = system_resolver):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.resolver = resolver  # Swap in a stub to test without a network
+        self.lock = threading.Lock()
+        # {host: (expires, addresses, error)}; exactly one of addresses/error is set
+        self.entries: Dict[str, Tuple[float, Optional[List[str]], Optional[socket.gaierror]]] = {}
+        self.inflight: Dict[str, Future] = {}  # Concurrent lookups of one host share a single resolver call
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, host: str) -> Optional[Tuple[float, Optional[List[str]], Optional[socket.gaierror]]]:
+        """Unexpired entry for host, if any"""
+        with self.lock:
+            entry = self.entries.get(host)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry
+        return None
+
+    def failure(self, host: str) -> Optional[str]:
+        """Error text if host is cached as non-existent"""
+        entry = self.cached(host)
+        return str(entry[2]) if entry and entry[2] else None
+
+    def resolve(self, host: str) -> str:
+        """Preferred address for host"""
+        return self.resolve_all(host)[0]
+
+    def resolve_all(self, host: str) -> List[str]:
+        """All addresses for host, raising socket.gaierror for unresolvable names (cached NXDOMAIN raises at once)"""
+        entry = self.cached(host)
+        if entry:
+            if entry[2]:
+                raise socket.gaierror(*entry[2].args)
+            return entry[1]
+
+        with self.lock:
+            future = self.inflight.get(host)
+            owner = future is None
+            if owner:
+                future = self.inflight[host] = Future()
+                self.misses += 1
+        if not owner:
+            return future.result()
+
+        try:
+            addresses = self.resolver(host)
+            if isinstance(addresses, str):
+                addresses = [addresses]
+            if not addresses:
+                raise socket.gaierror(socket.EAI_NONAME, f"no addresses for {host}")
+            addresses = list(addresses)
+        except socket.gaierror as e:
+            with self.lock:
+                if e.errno in NEGATIVE_ERRORS:
+                    self.entries[host] = (time.monotonic() + self.negative_ttl, None, e)
+                del self.inflight[host]
+            future.set_exception(e)
+            raise
+        except Exception as e:
+            with self.lock:
+                del self.inflight[host]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.entries[host] = (time.monotonic() + self.ttl, addresses, None)
+            del self.inflight[host]
+        future.set_result(addresses)
+        return addresses
+
+    async def resolve_async(self, host: str) -> List[str]:
+        """resolve_all() for event loop code; cache hits don't leave the loop"""
+        entry = self.cached(host)
+        if entry:
+            if entry[2]:
+                raise socket.gaierror(*entry[2].args)
+            return entry[1]
+        return await asyncio.get_running_loop().run_in_executor(None, self.resolve_all, host)
+
+    def prefetch(self, hosts: Iterable[str], workers: int = PREFETCH_WORKERS) -> int:
+        """Resolve all distinct hosts in parallel, returning how many failed"""
+        hosts = sorted({host for host in hosts if host})
+
+        def try_resolve(host: str) -> bool:
+            try:
+                self.resolve(host)
+                return True
+            except Exception:
+                return False
+
+        if not hosts:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(workers, len(hosts))) as executor:
+            return sum(not ok for ok in executor.map(try_resolve, hosts))
+
+    def create_connection(self, address, *args, **kwargs) -> socket.socket:
+        """socket.create_connection with the host looked up in this cache, trying each address in turn"""
+        host, port = address
+        error = None
+        for resolved in self.resolve_all(host):
+            try:
+                return socket.create_connection((resolved, port), *args, **kwargs)
+            except OSError as e:
+                error = e
+        raise error
+
+    def build_opener(self) -> urllib.request.OpenerDirector:
+        """urllib opener whose http/https connections resolve through this cache"""
+        return urllib.request.build_opener(CachedHTTPHandler(self), CachedHTTPSHandler(self))
+
+
+class CachedHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, dns: DNSCache, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = dns.create_connection
+
+
+class CachedHTTPSConnection(http.client.HTTPSConnection):
+    # TLS still uses self.host for SNI and certificate checks; only the TCP connect goes to the cached address
+    def __init__(self, *args, dns: DNSCache, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = dns.create_connection
+
+
+class CachedHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, dns: DNSCache):
+        super().__init__()
+        self.dns = dns
+
+    def http_open(self, req):
+        return self.do_open(partial(CachedHTTPConnection, dns=self.dns), req)
+
+
+class CachedHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, dns: DNSCache):
+        super().__init__()
+        self.dns = dns
+
+    def https_open(self, req):
+        return self.do_open(partial(CachedHTTPSConnection, dns=self.dns), req, context=self._context)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import urlparse
+
+from dns_cache import DNSCache
+from probe_history import adaptive_timeout
+
+# Default cache location (repo root/.cache/fetch), restored between workflow runs by actions/cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'fetch')
+MAX_LATENCY_SAMPLES = 20  # Download times kept per URL for adaptive timeouts
+CHUNK_SIZE = 64 * 1024  # Read size when streaming a body to a sink
+
+
+class FetchResult(NamedTuple):
+    data: Optional[bytes]  # None when the body was streamed to a sink (or, on 304, left in the cache for iter_body)
+    sha256: str
+    from_cache: bool  # True when the server answered 304 and the cached body was reused
+
+
+class FetchCache:
+    """Persistent conditional-GET cache for upstream playlists, keyed by URL"""
+
+    def __init__(self, cache_dir: str = None, dns: DNSCache = None):
+        self.opener = (dns or DNSCache()).build_opener()
+        self.cache_dir = cache_dir or os.environ.get('FETCH_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.index_file = os.path.join(self.cache_dir, 'index.json')
+        self.lock = threading.Lock()
+        self.index: Dict[str, Dict[str, Any]] = self.load_index()
+
+    def load_index(self) -> Dict[str, Dict[str, Any]]:
+        """Load cache metadata {url: {etag, last_modified, sha256, latency_ms}}"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error loading fetch cache index: {e}")
+            return {}
+
+    def save(self):
+        """Write cache metadata back to disk"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with self.lock:
+                tmp_file = self.index_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.index, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_file, self.index_file)
+        except Exception as e:
+            print(f"Error saving fetch cache index: {e}")
+
+    def path_for(self, url: str, suffix: str) -> str:
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.{suffix}")
+
+    def read_body(self, url: str) -> Optional[bytes]:
+        try:
+            with open(self.path_for(url, 'body'), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def iter_body(self, url: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Cached body in chunks, for feeding a streaming parser after a 304"""
+        with open(self.path_for(url, 'body'), 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def stream_body(self, url: str, response, sink: Callable[[bytes], None]) -> str:
+        """Copy a response body to the cache chunk by chunk, handing each chunk to sink; returns its sha256"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        tmp_file = self.path_for(url, 'body.tmp')
+        try:
+            with open(tmp_file, 'wb') as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    sink(chunk)
+            os.replace(tmp_file, self.path_for(url, 'body'))
+        except BaseException:
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+            raise
+        return digest.hexdigest()
+
+    def write_body(self, url: str, data: bytes):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = self.path_for(url, 'body.tmp')
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, self.path_for(url, 'body'))
+
+    def record_latency(self, url: str, entry: Dict[str, Any], start_time: float):
+        """Append this download's time to the URL's samples (caller holds the lock)"""
+        samples = entry.get('latency_ms', []) + [round((time.monotonic() - start_time) * 1000)]
+        entry['latency_ms'] = samples[-MAX_LATENCY_SAMPLES:]
+        self.index[url] = entry
+
+    def host_latencies(self, url: str) -> List[float]:
+        """Recorded download times of every cached URL on the same host"""
+        host = urlparse(url).netloc
+        with self.lock:
+            return [latency for cached_url, entry in self.index.items() if urlparse(cached_url).netloc == host
+                    for latency in entry.get('latency_ms', [])]
+
+    def timeout_for(self, url: str, default: float, floor: float, ceiling: float) -> float:
+        """Adaptive timeout for the URL's host, learned from earlier downloads"""
+        return adaptive_timeout(self.host_latencies(url), default, floor, ceiling)
+
+    def fetch(self, url: str, headers: Dict[str, str], timeout: float,
+              sink: Callable[[bytes], None] = None) -> FetchResult:
+        """GET url with If-None-Match/If-Modified-Since, reusing the cached body on 304.
+        With a sink, a changed body is passed to it chunk by chunk as it downloads instead of being returned"""
+        with self.lock:
+            entry = dict(self.index.get(url, {}))
+
+        cached = bool(entry) and os.path.exists(self.path_for(url, 'body'))
+        request_headers = dict(headers)
+        if cached:
+            if entry.get('etag'):
+                request_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request_headers['If-Modified-Since'] = entry['last_modified']
+
+        req = urllib.request.Request(url, headers=request_headers)
+        start_time = time.monotonic()
+        try:
+            with self.opener.open(req, timeout=timeout) as response:
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                if sink is not None:
+                    data = None
+                    sha256 = self.stream_body(url, response, sink)
+                else:
+                    data = response.read()
+                    sha256 = hashlib.sha256(data).hexdigest()
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached:
+                with self.lock:
+                    self.record_latency(url, entry, start_time)
+                return FetchResult(None if sink is not None else self.read_body(url), entry['sha256'], True)
+            raise
+
+        if data is not None and (sha256 != entry.get('sha256') or not cached):
+            self.write_body(url, data)
+        with self.lock:
+            self.record_latency(url, {'etag': etag, 'last_modified': last_modified, 'sha256': sha256,
+                                      'latency_ms': entry.get('latency_ms', [])}, start_time)
+        return FetchResult(data, sha256, False)
+
+    def get_parsed(self, url: str, namespace: str, sha256: str) -> Optional[Any]:
+        """Return the parse result stored for this exact body, or None if the body changed"""
+        try:
+            with open(self.path_for(url, f"{namespace}.json"), 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached['parsed'] if cached.get('sha256') == sha256 else None
+
+    def put_parsed(self, url: str, namespace: str, sha256: str, parsed: Any):
+        """Store a parse result for this body so an unchanged source can skip re-parsing"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.path_for(url, f"{namespace}.json"), 'w', encoding='utf-8') as f:
+                json.dump({'sha256': sha256, 'parsed': parsed}, f, ensure_ascii=False)
+        except Exception as e:
+            print(f"Error caching parsed content for {url}: {e}")
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+FFPROBE_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # ffprobe mostly waits on the network
+ANALYZE_DURATION_US = 2_000_000  # -analyzeduration: stop analysing after 2s of stream
+PROBE_SIZE = 512 * 1024  # -probesize: or after this many bytes
+CACHE_TTL_HOURS = 12  # Successful results are reused for this long
+# The checker's cache: timestamped per-URL state, so kept out of git in .cache/ (restored with actions/cache)
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'ffprobe_cache.json')
+# Where earlier versions kept it; moved to DEFAULT_CACHE_FILE on first use
+LEGACY_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'assets', 'whitelist-blacklist', 'ffprobe_cache.json')
+
+
+@dataclass
+class StreamInfo:
+    success: bool
+    elapsed_ms: Optional[float] = None  # Set when ffprobe ran to completion
+    error: str = ''
+    codec: str = ''  # Video codec, else the first stream's
+    resolution: str = ''  # WIDTHxHEIGHT of the video stream
+    bitrate_kbps: Optional[float] = None
+    ts: float = 0.0
+
+
+def parse_ffprobe_output(output: bytes) -> StreamInfo:
+    """Build a StreamInfo from `ffprobe -print_format json -show_streams -show_format` output"""
+    data = json.loads(output or b'{}')
+    streams = data.get('streams') or []
+    if not streams:
+        return StreamInfo(False, error='no streams')
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    stream = video or streams[0]
+    info = StreamInfo(True, codec=stream.get('codec_name', ''))
+    if video and video.get('width') and video.get('height'):
+        info.resolution = f"{video['width']}x{video['height']}"
+    bit_rate = (data.get('format') or {}).get('bit_rate') or stream.get('bit_rate')
+    try:
+        info.bitrate_kbps = int(bit_rate) / 1000 if bit_rate else None
+    except ValueError:
+        pass
+    return info
+
+
+class FFprobeScheduler:
+    """Runs ffprobe for rtmp/rtsp URLs on a bounded number of processes, caching results per URL on disk"""
+
+    def __init__(self, cache_file: str = None, workers: int = FFPROBE_WORKERS, timeout: float = 6,
+                 ttl_hours: float = CACHE_TTL_HOURS):
+        self.cache_file = cache_file
+        self.workers = workers
+        self.timeout = timeout
+        self.ttl = ttl_hours * 3600
+        self.lock = threading.Lock()
+        self.slots: Optional[asyncio.Semaphore] = None  # Created on first use, inside the running loop
+        self.cache: Dict[str, dict] = {}
+        if cache_file:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+            if (cache_file == DEFAULT_CACHE_FILE and not os.path.exists(cache_file)
+                    and os.path.exists(LEGACY_CACHE_FILE)):
+                os.replace(LEGACY_CACHE_FILE, cache_file)
+        self.load()
+
+    def load(self):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self.cache = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading ffprobe cache {self.cache_file}: {e}")
+
+    def save(self):
+        """Write the cache back, dropping expired entries"""
+        if not self.cache_file:
+            return
+        now = time.time()
+        try:
+            with self.lock:
+                self.cache = {url: entry for url, entry in self.cache.items() if now - entry['ts'] < self.ttl}
+                tmp_file = self.cache_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.cache, f, ensure_ascii=False, indent=1, sort_keys=True)
+                os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"Error saving ffprobe cache {self.cache_file}: {e}")
+
+    def cached(self, url: str) -> Optional[StreamInfo]:
+        """A successful result younger than the TTL, if any; failures are always re-probed"""
+        with self.lock:
+            entry = self.cache.get(url)
+        if entry and entry['success'] and time.time() - entry['ts'] < self.ttl:
+            return StreamInfo(**entry)
+        return None
+
+    def command(self, url: str, timeout: float):
+        return ['ffprobe', '-v', 'error', '-hide_banner',
+                '-analyzeduration', str(ANALYZE_DURATION_US), '-probesize', str(PROBE_SIZE),
+                '-rw_timeout', str(int(timeout * 1_000_000)),
+                '-print_format', 'json', '-show_streams', '-show_format', url]
+
+    async def run(self, url: str, timeout: float = None) -> StreamInfo:
+        """Probe one URL once a process slot is free; time spent queued does not count against the timeout"""
+        timeout = timeout or self.timeout
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.workers)
+        async with self.slots:
+            start_time = time.monotonic()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *self.command(url, timeout), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+            except Exception as e:
+                return StreamInfo(False, error=str(e) or type(e).__name__, ts=time.time())
+            try:
+                output, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
+                elapsed_ms = (time.monotonic() - start_time) * 1000
+                if process.returncode != 0:
+                    info = StreamInfo(False, elapsed_ms, f"ffprobe exited with {process.returncode}")
+                else:
+                    info = parse_ffprobe_output(output)
+                    info.elapsed_ms = elapsed_ms
+            except asyncio.TimeoutError:
+                info = StreamInfo(False, error=f"timed out after {timeout:g}s")
+            except ValueError as e:
+                info = StreamInfo(False, error=f"bad ffprobe output: {e}")
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+        info.ts = time.time()
+        with self.lock:
+            self.cache[url] = asdict(info)
+        return info
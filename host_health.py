@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+from typing import Dict
+
+FAILURE_THRESHOLD = 5  # Consecutive failures that open a host's circuit
+HALF_LIFE_HOURS = 72  # Failure counts halve every HALF_LIFE_HOURS without new failures
+# Timestamped state that changes every run, so kept out of git in .cache/ (restored with actions/cache);
+# the checker still commits the human-readable blackhost_count.txt
+DEFAULT_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'host_health.json')
+# Where earlier versions kept it; moved to DEFAULT_STATE_FILE on first use
+LEGACY_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'assets', 'whitelist-blacklist', 'host_health.json')
+
+
+class HostHealth:
+    """Per-host failure scoreboard with time decay and a circuit breaker, persisted as JSON"""
+
+    def __init__(self, state_file: str = DEFAULT_STATE_FILE, threshold: int = FAILURE_THRESHOLD,
+                 half_life_hours: float = HALF_LIFE_HOURS):
+        self.state_file = state_file
+        os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+        if state_file == DEFAULT_STATE_FILE and not os.path.exists(state_file) and os.path.exists(LEGACY_STATE_FILE):
+            os.replace(LEGACY_STATE_FILE, state_file)
+        self.threshold = threshold
+        self.half_life = half_life_hours * 3600
+        self.lock = threading.Lock()
+        # {host: {"failures": decayed total, "consecutive": failures in a row, "updated": timestamp}}
+        self.hosts: Dict[str, Dict[str, float]] = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                self.hosts = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading host health {self.state_file}: {e}")
+
+    def seed_from_counts(self, count_file: str):
+        """Bootstrap from blackhost_count.txt ("host: count") when there is no saved state yet"""
+        if self.hosts:
+            return
+        try:
+            mtime = os.path.getmtime(count_file)
+            with open(count_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    host, sep, count = line.strip().rpartition(': ')
+                    if sep and host and count.isdigit():
+                        self.hosts[host] = {'failures': int(count), 'consecutive': int(count), 'updated': mtime}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error reading {count_file}: {e}")
+
+    def save(self):
+        try:
+            with self.lock:
+                tmp_file = self.state_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.hosts, f, ensure_ascii=False, indent=1, sort_keys=True)
+                os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            print(f"Error saving host health {self.state_file}: {e}")
+
+    def decay(self, value: float, updated: float, now: float) -> float:
+        return value * 0.5 ** (max(0.0, now - updated) / self.half_life)
+
+    def record(self, host: str, success: bool):
+        """Count one probe outcome for a host"""
+        now = time.time()
+        with self.lock:
+            entry = self.hosts.get(host, {'failures': 0, 'consecutive': 0, 'updated': now})
+            failures = self.decay(entry['failures'], entry['updated'], now)
+            if success:
+                self.hosts[host] = {'failures': failures, 'consecutive': 0, 'updated': now}
+            else:
+                self.hosts[host] = {'failures': failures + 1, 'consecutive': entry['consecutive'] + 1, 'updated': now}
+
+    def is_open(self, host: str) -> bool:
+        """Circuit is open after `threshold` failures in a row, until the streak decays below it"""
+        with self.lock:
+            entry = self.hosts.get(host)
+            if not entry:
+                return False
+            return self.decay(entry['consecutive'], entry['updated'], time.time()) >= self.threshold
@@ -1,19 +1,91 @@
 import urllib.request
 from urllib.parse import urlparse
-import re
 import os
 from datetime import datetime, timedelta, timezone
 import random
-import opencc
-from typing import List, Set, Dict, Tuple, DefaultDict
+import heapq
+import threading
+import time
+from typing import Any, Callable, List, Dict, Tuple, DefaultDict, Optional
 from collections import defaultdict
+from dataclasses import asdict
+from functools import lru_cache, partial
+from channel_names import CORRECTIONS_FILE, ChannelNameNormalizer, load_corrections_name
+from dns_cache import DNSCache
+from fetch_cache import FetchCache, FetchResult
+from playlist_parser import PlaylistStreamParser, Record, SourceExpander
+from probe_history import DEFAULT_HISTORY_FILE, ProbeHistory
+from prober import CheckResult
+from run_metrics import CHECK_METRICS_FILE, METRICS_FILE, RunMetrics, latency_histogram, load_metrics
+from staged_pipeline import Emit, Stage, StagedPipeline, StageStats
+
+class TopKSources:
+    """Bounded store of the K fastest sources of one channel"""
+
+    def __init__(self, k: int):
+        self.k = k
+        # Max-heap via negated keys: the root is the slowest kept source (latest on ties)
+        self.heap: List[Tuple[float, int, str]] = []
+        self.seq = 0
+        self.top_cache: Optional[List[str]] = None
+
+    def push(self, response_time: float, url: str):
+        """Offer a source in O(log K); ties keep the earliest offered, like a stable sort"""
+        self.seq += 1
+        item = (-response_time, -self.seq, url)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+        elif item > self.heap[0]:
+            heapq.heapreplace(self.heap, item)
+        else:
+            return
+        self.top_cache = None
+
+    def top(self) -> List[str]:
+        """URLs ordered by response time, computed once per change"""
+        if self.top_cache is None:
+            self.top_cache = [url for (_, _, url) in sorted(self.heap, reverse=True)]
+        return self.top_cache
+
 
 class TVChannelProcessor:
     def __init__(self):
         self.timestart = datetime.now()
         self.combined_blacklist = set()
         self.all_urls = set()  # For global URL deduplication
-        self.channel_sources = defaultdict(list)  # Stores sources for each channel with response times
+        self.max_sources = 5  # Sources kept per channel
+        self.url_scores: Dict[str, float] = {}  # Long-term quality score per URL from the checker's probe history
+        self.channel_sources = defaultdict(lambda: TopKSources(self.max_sources))  # Fastest sources for each channel
+        
+        # Concurrent fetch settings
+        self.fetch_workers = 16  # Max upstream fetches in flight
+        self.per_host_limit = 4  # Max concurrent fetches against one host
+        self.fetch_timeout = 10  # Per-request timeout for upstreams without fetch history (seconds)
+        self.fetch_timeout_floor = 3  # Bounds for timeouts learned from earlier downloads
+        self.fetch_timeout_ceiling = 30
+        self.fetch_deadline = 180  # Global deadline for the whole fetch stage (seconds)
+        self.host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self.dns_cache = DNSCache()
+        self.fetch_cache = FetchCache(dns=self.dns_cache)  # Conditional-GET cache shared with the checker
+        
+        # Channel name normalization (shared with the checker) and a bounded raw -> canonical name cache
+        self.name_normalizer = ChannelNameNormalizer()
+        self.normalize_cache_size = 8192
+        self.normalize_channel_name = lru_cache(maxsize=self.normalize_cache_size)(self.name_normalizer.normalize)
+        self.tvg_id_index: Dict[str, str] = {}  # Exact tvg-id/tvg-name -> canonical name, checked before cleaning
+        self.tvg_id_hits = 0
+        self.source_expander = SourceExpander()  # Splits url1#url2 backup sources into separate candidates
+        
+        # Staged pipeline settings
+        self.chunk_queue_size = 64  # Body chunks (64KB each) waiting to be parsed; full queues pause downloads
+        self.stage_batch_size = 512  # Sources per item passed between normalize, filter and rank
+        self.reorder_window = 2 * self.fetch_workers  # Upstreams fetched past one still downloading, at most
+        self.parsers: Dict[int, Tuple[PlaylistStreamParser, List[Record]]] = {}  # Parse stage state per download
+        self.stage_stats: List[StageStats] = []
+        
+        # Per-run instrumentation, written to metrics.json next to live.txt
+        self.metrics = RunMetrics()
+        self.upstream_metrics: Dict[str, Dict[str, Any]] = {}  # {url: status, elapsed_ms, bytes, lines, records}
         
         # Initialize all channel containers
         self.init_channel_containers()
@@ -50,7 +122,6 @@ class TVChannelProcessor:
         # ... (other local channels initialized similarly)
         
         self.other_lines = []  # Other channels
-        self.removal_list = ["「IPV4」","「IPV6」","[ipv6]","[ipv4]","_电信", "电信","（HD）","[超清]","高清","超清", "-HD","(HK)","AKtv","@","IPV6","🎞️","🎦"," ","[BD]","[VGA]","[HD]","[SD]","(1080p)","(720p)","(480p)"]
 
     def read_txt_to_array(self, file_name: str) -> List[str]:
         """Read text file into array of lines"""
@@ -74,81 +145,29 @@ class TVChannelProcessor:
             print(f"Error reading blacklist {file_path}: {e}")
             return []
 
-    def load_corrections_name(self, filename: str) -> Dict[str, str]:
-        """Load channel name corrections"""
-        corrections = {}
+    def load_url_scores(self, db_file: str):
+        """Load per-URL ranking scores (EWMA/p95 latency over success ratio) from the probe history"""
+        if not os.path.exists(db_file):
+            print(f"Probe history '{db_file}' not found.")
+            return
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        parts = line.strip().split(',')
-                        correct_name = parts[0]
-                        for name in parts[1:]:
-                            corrections[name] = correct_name
+            history = ProbeHistory(db_file)
+            self.url_scores = {url: stats.score for url, stats in history.stats().items()}
+            history.close()
+            print(f"Probe history scores: {len(self.url_scores)}")
         except Exception as e:
-            print(f"Error loading corrections: {e}")
-        return corrections
-
-    def traditional_to_simplified(self, text: str) -> str:
-        """Convert traditional Chinese to simplified Chinese"""
-        try:
-            converter = opencc.OpenCC('t2s')
-            return converter.convert(text)
-        except Exception as e:
-            print(f"Error in traditional to simplified conversion: {e}")
-            return text
-
-    def is_m3u_content(self, text: str) -> bool:
-        """Check if content is M3U format"""
-        lines = text.splitlines()
-        return lines and lines[0].strip().startswith("#EXTM3U")
-
-    def convert_m3u_to_txt(self, m3u_content: str) -> str:
-        """Convert M3U content to TXT format"""
-        lines = m3u_content.split('\n')
-        txt_lines = []
-        channel_name = ""
-        
-        for line in lines:
-            if line.startswith("#EXTM3U"):
-                continue
-            if line.startswith("#EXTINF"):
-                channel_name = line.split(',')[-1].strip()
-            elif line.startswith(("http", "rtmp", "p3p")):
-                txt_lines.append(f"{channel_name},{line.strip()}")
-            
-            # Handle M3U files with TXT content
-            if "#genre#" not in line and "," in line and "://" in line:
-                pattern = r'^[^,]+,[^\s]+://[^\s]+$'
-                if re.match(pattern, line):
-                    txt_lines.append(line)
-        
-        return '\n'.join(txt_lines)
+            print(f"Error loading probe history {db_file}: {e}")
 
     def clean_url(self, url: str) -> str:
         """Remove content after $ in URL"""
         last_dollar_index = url.rfind('$')
         return url[:last_dollar_index] if last_dollar_index != -1 else url
 
-    def clean_channel_name(self, channel_name: str) -> str:
-        """Clean channel name by removing unwanted patterns"""
-        for item in self.removal_list:
-            channel_name = channel_name.replace(item, "")
-        
-        replacements = {
-            "CCTV-": "CCTV",
-            "CCTV0": "CCTV",
-            "PLUS": "+",
-            "NewTV-": "NewTV",
-            "iHOT-": "iHOT",
-            "NEW": "New",
-            "New_": "New"
-        }
-        
-        for old, new in replacements.items():
-            channel_name = channel_name.replace(old, new)
-            
-        return channel_name
+    def build_tvg_id_index(self):
+        """Index dictionary channel names and name corrections for exact M3U attribute lookups"""
+        self.tvg_id_index = {name: name for name in self.ys_dictionary + self.ws_dictionary}
+        self.tvg_id_index.update(self.corrections_name)
+        self.tvg_id_index.update((name, name) for name in set(self.corrections_name.values()))
 
     def process_channel_line(self, line: str):
         """Process a single channel line and store with response time"""
@@ -170,32 +189,63 @@ class TVChannelProcessor:
                     channel_name, channel_address = line.split(',', 1)
                     response_time = float('inf')  # Default to slowest if no time provided
                 
-                channel_name = self.traditional_to_simplified(channel_name)
-                channel_name = self.clean_channel_name(channel_name)
-                channel_name = self.corrections_name.get(channel_name, channel_name).strip()
-                
-                channel_address = self.clean_url(channel_address).strip()
-                
-                if not channel_address or channel_address in self.combined_blacklist:
-                    return
-                    
-                if channel_address in self.all_urls:
-                    return
-                    
-                self.all_urls.add(channel_address)
-                
-                # Store URL with response time for sorting later
-                self.channel_sources[channel_name].append((response_time, channel_address))
+                self.process_channel(channel_name, channel_address, response_time)
                 
             except Exception as e:
                 print(f"Error processing channel line: {e}")
 
+    def process_channel(self, channel_name: str, channel_address: str, response_time: float = float('inf'),
+                        tvg_id: str = '', tvg_name: str = ''):
+        """Normalize one record and store each of its source URLs with its response time"""
+        for source in self.record_sources(channel_name, channel_address, response_time, tvg_id, tvg_name):
+            self.add_source(*source)
+
+    def record_sources(self, channel_name: str, channel_address: str, response_time: float = float('inf'),
+                       tvg_id: str = '', tvg_name: str = '') -> List[Tuple[str, str, float]]:
+        """(canonical channel name, url, response time) for each source URL of one record"""
+        channel_name = self.canonical_name(channel_name, tvg_id, tvg_name)
+        # Each fragment of a url1#url2 source is deduplicated and ranked on its own
+        return [(channel_name, fragment, response_time) for fragment in self.source_expander.expand(channel_address)]
+
+    def canonical_name(self, channel_name: str, tvg_id: str = '', tvg_name: str = '') -> str:
+        """Canonical channel name of a record"""
+        # A tvg-id/tvg-name that is already a known channel skips the string-cleaning path
+        canonical = self.tvg_id_index.get(tvg_id) or self.tvg_id_index.get(tvg_name)
+        if canonical:
+            self.tvg_id_hits += 1
+            return canonical
+        return self.normalize_channel_name(channel_name)
+
+    def admit_source(self, channel_address: str, response_time: float) -> Optional[Tuple[str, float]]:
+        """Cleaned URL and ranking time of a source, or None if it is blacklisted or already seen"""
+        channel_address = self.clean_url(channel_address).strip()
+        
+        if not channel_address or channel_address in self.combined_blacklist:
+            return None
+        
+        # Prefer the stable long-term score over a single latency sample
+        response_time = self.url_scores.get(channel_address, response_time)
+            
+        if channel_address in self.all_urls:
+            return None
+            
+        self.all_urls.add(channel_address)
+        return channel_address, response_time
+
+    def add_source(self, channel_name: str, channel_address: str, response_time: float):
+        """Store one source URL for an already normalized channel name"""
+        admitted = self.admit_source(channel_address, response_time)
+        if admitted:
+            self.rank_source(channel_name, *admitted)
+
+    def rank_source(self, channel_name: str, channel_address: str, response_time: float):
+        """Keep the URL if it is among the channel's fastest sources"""
+        self.channel_sources[channel_name].push(response_time, channel_address)
+
     def get_top_sources(self, channel_name: str) -> List[str]:
-        """Get top 5 fastest sources for a channel"""
-        sources = self.channel_sources.get(channel_name, [])
-        # Sort by response time (ascending) and take top 5
-        sorted_sources = sorted(sources, key=lambda x: x[0])[:5]
-        return [url for (_, url) in sorted_sources]
+        """Get the max_sources fastest sources for a channel"""
+        sources = self.channel_sources.get(channel_name)
+        return sources.top() if sources else []
 
     def categorize_channel(self, channel_name: str):
         """Categorize channel based on its name and return top 5 URLs"""
@@ -205,49 +255,191 @@ class TVChannelProcessor:
             lines.append(f"{channel_name},{url}")
         return lines
 
-    def process_url(self, url: str):
-        """Process a URL to extract channel information"""
-        print(f"Processing URL: {url}")
-        self.other_lines.append(f"{url},#genre#")
+    def download(self, url: str, deadline: float, sink: Callable[[bytes], None]) -> Optional[FetchResult]:
+        """Download a single upstream playlist into sink, honouring the per-host limit and global deadline.
+        None if the deadline passed before the download could start"""
+        upstream = self.upstream_metrics[url] = {'status': 'skipped', 'bytes': 0}
         
-        try:
-            headers = {'User-Agent': 'PostmanRuntime-ApipostRuntime/1.1.0'}
-            req = urllib.request.Request(url, headers=headers)
+        def deadline_sink(chunk: bytes):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"fetch deadline exceeded for {url}")
+            upstream['bytes'] += len(chunk)
+            sink(chunk)
+        
+        with self.host_semaphores[urlparse(url).netloc]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Fetch deadline exceeded, skipping {url}")
+                return None
             
-            with urllib.request.urlopen(req, timeout=10) as response:
-                data = response.read()
-                
-                # Try different encodings
-                encodings = ['utf-8', 'gbk', 'iso-8859-1']
-                text = None
-                
-                for encoding in encodings:
-                    try:
-                        text = data.decode(encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                
-                if text is None:
-                    print(f"Could not decode content from {url}")
+            headers = {'User-Agent': 'PostmanRuntime-ApipostRuntime/1.1.0'}
+            timeout = self.fetch_cache.timeout_for(url, self.fetch_timeout, self.fetch_timeout_floor,
+                                                   self.fetch_timeout_ceiling)
+            start_time = time.perf_counter()
+            try:
+                result = self.fetch_cache.fetch(url, headers, timeout=min(timeout, remaining), sink=deadline_sink)
+            except Exception as e:
+                upstream.update(status='failed', error=str(e) or type(e).__name__)
+                raise
+            finally:
+                upstream['elapsed_ms'] = round((time.perf_counter() - start_time) * 1000, 1)
+        upstream['status'] = 'unchanged' if result.from_cache else 'ok'
+        return result
+
+    def cached_records(self, url: str, result: FetchResult) -> Optional[List[Record]]:
+        """Records parsed on a previous run, if the upstream is unchanged since"""
+        if not result.from_cache:
+            return None
+        cached = self.fetch_cache.get_parsed(url, 'main_extinf', result.sha256)
+        if cached is None:
+            return None
+        print(f"Unchanged {url}, {len(cached)} cached records")
+        self.upstream_metrics.setdefault(url, {})['records'] = len(cached)
+        return [Record(*record) for record in cached]
+
+    def finish_parse(self, url: str, result: FetchResult, parser: PlaylistStreamParser,
+                     records: List[Record]) -> List[Record]:
+        """Flush the parser and cache its records under the body's hash"""
+        records.extend(parser.close())
+        print(f"Fetched {url}: {parser.line_count} lines, {len(records)} records ({parser.format}, {parser.encoding})")
+        self.upstream_metrics.setdefault(url, {}).update(lines=parser.line_count, records=len(records),
+                                                         format=parser.format, encoding=parser.encoding)
+        self.fetch_cache.put_parsed(url, 'main_extinf', result.sha256, records)
+        return records
+
+    def prepare_fetch(self, urls: List[str]) -> float:
+        """Set up per-host limits and resolve upstream hosts; returns the fetch deadline"""
+        deadline = time.monotonic() + self.fetch_deadline
+        for url in urls:
+            host = urlparse(url).netloc
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+        
+        # Resolve all upstream hosts up front; unresolvable ones then fail without a timeout
+        failed = self.dns_cache.prefetch(urlparse(url).hostname for url in urls)
+        if failed:
+            print(f"DNS resolution failed for {failed} upstream hosts")
+        return deadline
+
+    # Staged processing of the upstream sources. Each stage runs on its own thread(s), joined by bounded
+    # queues, so downloads, parsing and normalization overlap. Stages after parse each own the state they
+    # touch (name caches / all_urls / channel_sources), so they need no locks.
+
+    def fetch_stage(self, item: Tuple[int, str], emit: Emit, deadline: float):
+        """(index, url) -> ('chunk', index, url, bytes)... then ('end', index, url, result),
+        or ('records', index, url, records) for an unchanged upstream, or ('failed', index, url, None)"""
+        index, url = item
+        try:
+            result = self.download(url, deadline, lambda chunk: emit(('chunk', index, url, chunk)))
+            if result is None:
+                emit(('failed', index, url, None))
+                return
+            if result.from_cache:
+                cached = self.cached_records(url, result)
+                if cached is not None:
+                    emit(('records', index, url, cached))
                     return
-                
-                # Convert M3U to TXT if needed
-                if self.is_m3u_content(text):
-                    text = self.convert_m3u_to_txt(text)
-                
-                # Process each line
-                lines = text.split('\n')
-                print(f"Lines: {len(lines)}")
-                
-                for line in lines:
-                    if "#genre#" not in line and "," in line and "://" in line:
-                        self.process_channel_line(line)
-                
-                self.other_lines.append('\n')
-                
+                for chunk in self.fetch_cache.iter_body(url):
+                    emit(('chunk', index, url, chunk))
+            emit(('end', index, url, result))
+        except Exception as e:
+            print(f"Error fetching URL {url}: {e}")
+            emit(('failed', index, url, None))
+
+    def parse_stage(self, item: Tuple[str, int, str, Any], emit: Emit):
+        """Decode and parse body chunks of any number of interleaved downloads -> (index, url, records or None)"""
+        kind, index, url, payload = item
+        if kind == 'chunk':
+            parser, records = self.parsers.setdefault(index, (PlaylistStreamParser(), []))
+            records.extend(parser.feed(payload))
+            return
+        parser, records = self.parsers.pop(index, (PlaylistStreamParser(), []))
+        if kind != 'end':
+            emit((index, url, payload))
+            return
+        # The ordered normalize stage waits for every index, so a parse error still passes one on
+        try:
+            records = self.finish_parse(url, payload, parser, records)
         except Exception as e:
-            print(f"Error processing URL {url}: {e}")
+            print(f"Error parsing {url}: {e}")
+            records = None
+        emit((index, url, records))
+
+    def normalize_stage(self, item: Tuple[int, str, Optional[List[Record]]], emit: Emit):
+        """One source's records, in urls.txt order -> batches of (channel name, url, response time)"""
+        _, url, records = item
+        print(f"Processing URL: {url}")
+        self.other_lines.append(f"{url},#genre#")
+        
+        if records is None:
+            return
+        
+        batch = []
+        for record in records:
+            try:
+                batch += self.record_sources(record.name, record.url, tvg_id=record.tvg_id, tvg_name=record.tvg_name)
+            except Exception as e:
+                print(f"Error processing channel {record.name}: {e}")
+            if len(batch) >= self.stage_batch_size:
+                emit(batch)
+                batch = []
+        if batch:
+            emit(batch)
+        
+        self.other_lines.append('\n')
+
+    def filter_stage(self, batch: List[Tuple[str, str, float]], emit: Emit):
+        """Drop blacklisted and already seen URLs"""
+        admitted = []
+        for channel_name, channel_address, response_time in batch:
+            source = self.admit_source(channel_address, response_time)
+            if source:
+                admitted.append((channel_name, source[0], source[1]))
+        if admitted:
+            emit(admitted)
+
+    def rank_stage(self, batch: List[Tuple[str, str, float]], emit: Emit):
+        """Keep each channel's fastest sources"""
+        for source in batch:
+            self.rank_source(*source)
+
+    def process_sources(self, urls: List[str] = None, fetched: Optional[Dict[str, Optional[List[Record]]]] = None):
+        """Run the upstream sources through fetch -> parse -> normalize -> blacklist/dedup -> rank.
+        With fetched (records from an earlier fetch) the pipeline starts at normalize"""
+        later_stages = [
+            # Keeps urls.txt order, so output stays stable
+            Stage('normalize', self.normalize_stage, ordered=True, window=self.reorder_window),
+            Stage('filter', self.filter_stage),
+            Stage('rank', self.rank_stage),
+        ]
+        if fetched is not None:
+            stages = later_stages
+            items = [(index, url, records) for index, (url, records) in enumerate(fetched.items())]
+        else:
+            stages = self.fetch_stages(urls) + later_stages
+            items = list(enumerate(urls))
+        self.stage_stats += StagedPipeline(stages).run(items)
+
+    def fetch_stages(self, urls: List[str]) -> List[Stage]:
+        """The fetch and parse stages for these upstream URLs, emitting (index, url, records or None)"""
+        deadline = self.prepare_fetch(urls)
+        self.parsers = {}
+        return [
+            Stage('fetch', partial(self.fetch_stage, deadline=deadline), workers=self.fetch_workers),
+            Stage('parse', self.parse_stage, queue_size=self.chunk_queue_size),
+        ]
+
+    def fetch_sources(self, urls: List[str]) -> Dict[str, Optional[List[Record]]]:
+        """Run only the fetch and parse stages, returning {url: records or None} in urls order"""
+        fetched: Dict[str, Optional[List[Record]]] = dict.fromkeys(urls)
+        
+        def collect_stage(item: Tuple[int, str, Optional[List[Record]]], emit: Emit):
+            _, url, records = item
+            fetched[url] = records
+        
+        self.stage_stats += StagedPipeline(self.fetch_stages(urls) + [Stage('collect', collect_stage)]).run(
+            enumerate(urls))
+        return fetched
 
     def sort_data(self, order: List[str], data: List[str]) -> List[str]:
         """Sort data based on a specified order"""
@@ -290,52 +482,110 @@ class TVChannelProcessor:
         except Exception as e:
             print(f"Error generating M3U file: {e}")
 
-    def run(self):
-        """Main execution method"""
+    def run(self, fetched: Optional[Dict[str, Optional[List[Record]]]] = None,
+            checked: Optional[CheckResult] = None):
+        """Main execution method.
+
+        fetched: parsed records per source URL from an earlier fetch stage, in urls.txt order; fetched here if None
+        checked: the checker's results, used instead of reading whitelist_auto.txt/blacklist_auto.txt
+        """
+        with self.metrics.phase('load'):
+            self.load_inputs(checked)
+        
+        # Process whitelists
+        with self.metrics.phase('whitelist'):
+            self.other_lines.append("白名单,#genre#")
+            for line in self.whitelist_lines:
+                self.process_channel_line(line)
+                
+            self.other_lines.append("白名单测速,#genre#")
+            if checked is not None:
+                for source in checked.success:
+                    self.process_channel(source.name, source.url, source.latency_ms)
+            else:
+                for line in self.whitelist_auto_lines:
+                    if "#genre#" not in line and "," in line and "://" in line:
+                        self.process_channel_line(line)
+        
+        # Fetch, parse, normalize, filter and rank the upstream sources concurrently
+        with self.metrics.phase('sources'):
+            if fetched is None:
+                urls = self.read_txt_to_array('assets/urls.txt')
+                self.process_sources(urls=[url for url in urls if url.startswith("http")])
+                self.fetch_cache.save()
+            else:
+                self.process_sources(fetched=fetched)
+        
+        # Generate output files with top 5 URLs per channel; this needs the final ranking, so it runs
+        # once the pipeline has drained
+        with self.metrics.phase('emit'):
+            self.generate_output_files()
+            
+            # Generate M3U files
+            self.make_m3u("live.txt", "live.m3u")
+            self.make_m3u("live_lite.txt", "live_lite.m3u")
+        
+        # Print statistics
+        self.print_statistics()
+        self.write_metrics(METRICS_FILE)
+
+    def load_inputs(self, checked: Optional[CheckResult] = None):
+        """Load blacklists, whitelists, dictionaries, probe scores and name corrections"""
         # Load blacklists
-        blacklist_auto = self.read_blacklist_from_txt('assets/whitelist-blacklist/blacklist_auto.txt')
+        if checked is not None:
+            blacklist_auto = checked.blacklist
+        else:
+            blacklist_auto = self.read_blacklist_from_txt('assets/whitelist-blacklist/blacklist_auto.txt')
         blacklist_manual = self.read_blacklist_from_txt('assets/whitelist-blacklist/blacklist_manual.txt')
         self.combined_blacklist = set(blacklist_auto + blacklist_manual)
         
         # Load whitelists
         self.whitelist_lines = self.read_txt_to_array('assets/whitelist-blacklist/whitelist_manual.txt')
-        self.whitelist_auto_lines = self.read_txt_to_array('assets/whitelist-blacklist/whitelist_auto.txt')
+        if checked is None:
+            self.whitelist_auto_lines = self.read_txt_to_array('assets/whitelist-blacklist/whitelist_auto.txt')
         
         # Load channel dictionaries
         self.ys_dictionary = self.read_txt_to_array('主频道/央视频道.txt')
         self.ws_dictionary = self.read_txt_to_array('主频道/卫视频道.txt')
         # ... load other dictionaries
         
-        # Load name corrections
-        self.corrections_name = self.load_corrections_name('assets/corrections_name.txt')
-        
-        # Load custom URLs
-        urls = self.read_txt_to_array('assets/urls.txt')
+        # Load probe history scores
+        self.load_url_scores(DEFAULT_HISTORY_FILE)
         
-        # Process whitelists
-        self.other_lines.append("白名单,#genre#")
-        for line in self.whitelist_lines:
-            self.process_channel_line(line)
-            
-        self.other_lines.append("白名单测速,#genre#")
-        for line in self.whitelist_auto_lines:
-            if "#genre#" not in line and "," in line and "://" in line:
-                self.process_channel_line(line)
-        
-        # Process URLs
-        for url in urls:
-            if url.startswith("http"):
-                self.process_url(url)
-        
-        # Generate output files with top 5 URLs per channel
-        self.generate_output_files()
-        
-        # Generate M3U files
-        self.make_m3u("live.txt", "live.m3u")
-        self.make_m3u("live_lite.txt", "live_lite.m3u")
-        
-        # Print statistics
-        self.print_statistics()
+        # Load name corrections
+        self.corrections_name = load_corrections_name(CORRECTIONS_FILE)
+        self.name_normalizer.corrections = self.corrections_name
+        self.build_tvg_id_index()
+
+    def write_metrics(self, path: str):
+        """Write this run's timings and counters as JSON, with the last checker run's metrics attached"""
+        cache_info = self.normalize_channel_name.cache_info()
+        lookups = cache_info.hits + cache_info.misses
+        self.metrics.set('stages', [
+            dict({key: round(value, 4) if isinstance(value, float) else value for key, value in asdict(stats).items()},
+                 throughput=round(stats.throughput, 1), mean_depth=round(stats.mean_depth, 2))
+            for stats in self.stage_stats])
+        self.metrics.set('upstreams', self.upstream_metrics)
+        self.metrics.set('upstream_latency_histogram', latency_histogram(
+            upstream['elapsed_ms'] for upstream in self.upstream_metrics.values() if upstream.get('elapsed_ms')))
+        self.metrics.set('normalization', {
+            'cache_hits': cache_info.hits,
+            'cache_misses': cache_info.misses,
+            'cache_hit_rate': round(cache_info.hits / lookups, 4) if lookups else None,
+            'cache_size': cache_info.currsize,
+            'tvg_id_hits': self.tvg_id_hits,
+            'lines_expanded': self.source_expander.lines_expanded,
+            'fragments': self.source_expander.fragments,
+        })
+        self.metrics.set('dns', {'hits': self.dns_cache.hits, 'misses': self.dns_cache.misses})
+        self.metrics.set('output', {
+            'urls': len(self.all_urls),
+            'channels': len(self.channel_sources),
+            'blacklist': len(self.combined_blacklist),
+            'others_lines': len(self.other_lines),
+        })
+        self.metrics.set('check', load_metrics(CHECK_METRICS_FILE))
+        self.metrics.write(path)
 
     def generate_output_files(self):
         """Generate the output TXT files with top 5 URLs per channel"""
@@ -414,6 +664,19 @@ class TVChannelProcessor:
         print(f"blacklist行数: {len(self.combined_blacklist)}")
         print(f"live.txt行数: {len(self.all_urls)}")
         print(f"others.txt行数: {len(self.other_lines)}")
+        
+        cache_info = self.normalize_channel_name.cache_info()
+        lookups = cache_info.hits + cache_info.misses
+        hit_rate = cache_info.hits / lookups * 100 if lookups else 0
+        print(f"频道名缓存: 命中 {cache_info.hits} 次, 未命中 {cache_info.misses} 次, "
+              f"命中率 {hit_rate:.1f}%, 缓存条目 {cache_info.currsize}/{cache_info.maxsize}")
+        print(f"tvg-id/tvg-name 直接匹配: {self.tvg_id_hits} 次")
+        print(f"多地址源拆分: {self.source_expander.lines_expanded} 行, 拆出 {self.source_expander.fragments} 个地址")
+        print("流水线各阶段:")
+        for stats in self.stage_stats:
+            print(f"  {stats.summary()}")
+        for name, phase in self.metrics.phases.items():
+            print(f"阶段 {name}: 耗时 {phase['wall_s']:.2f}s, CPU {phase['cpu_s']:.2f}s")
 
 if __name__ == "__main__":
     processor = TVChannelProcessor()
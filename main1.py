@@ -10,6 +10,37 @@ import concurrent.futures
 import time
 
 class TVChannelProcessor:
+    # Channel dictionary file name (主频道/, 地方台/, 专区/ without .txt) -> line container
+    category_containers = {
+        '央视频道': 'ys_lines',
+        '卫视频道': 'ws_lines',
+        '体育频道': 'ty_lines',
+        '电影频道': 'dy_lines',
+        '电视剧频道': 'dsj_lines',
+        '港澳台': 'gat_lines',
+        '台湾台': 'twt_lines',
+        '国际台': 'gj_lines',
+        '纪录片': 'jlp_lines',
+        '戏曲频道': 'xq_lines',
+        '解说频道': 'js_lines',
+        'NewTV': 'newtv_lines',
+        'iHOT': 'ihot_lines',
+        '儿童频道': 'et_lines',
+        '综艺频道': 'zy_lines',
+        '埋堆堆': 'mdd_lines',
+        '音乐频道': 'yy_lines',
+        '游戏频道': 'game_lines',
+        '收音机频道': 'radio_lines',
+        '直播中国': 'zb_lines',
+        '春晚': 'cw_lines',
+        'MTV': 'mtv_lines',
+        '咪咕直播': 'migu_lines',
+        '上海频道': 'sh_lines',
+        '浙江频道': 'zj_lines',
+    }
+
+    lite_categories = ('央视频道', '卫视频道')  # Also written to live_lite.txt, ahead of the other groups
+
     def __init__(self):
         self.timestart = datetime.now()
         self.combined_blacklist = set()
@@ -49,6 +80,7 @@ class TVChannelProcessor:
         self.sh_lines = []  # Shanghai
         self.zj_lines = []  # Zhejiang
         # ... (other local channels initialized similarly)
+        self.local_lines = {}  # Other 地方台 categories without a dedicated container {category: [line]}
         
         self.other_lines = []  # Other channels
         self.removal_list = ["「IPV4」","「IPV6」","[ipv6]","[ipv4]","_电信", "电信","（HD）","[超清]","高清","超清", "-HD","(HK)","AKtv","@","IPV6","🎞️","🎦"," ","[BD]","[VGA]","[HD]","[SD]","(1080p)","(720p)","(480p)"]
@@ -211,6 +243,37 @@ class TVChannelProcessor:
         # 注意：这个函数现在不会被直接调用，因为分类在最后统一处理
         pass
 
+    def build_category_index(self):
+        """Build the channel name -> category index from 主频道/, 地方台/ and 专区/"""
+        self.category_index: Dict[str, str] = {}
+        self.local_categories: List[str] = []
+        # Earlier directories win, matching the old if/elif priority
+        for directory in ['主频道', '地方台', '专区']:
+            try:
+                file_names = sorted(f for f in os.listdir(directory) if f.endswith('.txt'))
+            except FileNotFoundError:
+                print(f"Directory '{directory}' not found.")
+                continue
+            
+            for file_name in file_names:
+                category = file_name[:-len('.txt')]
+                if category not in self.category_containers and category not in self.local_categories:
+                    self.local_categories.append(category)
+                for line in self.read_txt_to_array(os.path.join(directory, file_name)):
+                    channel_name = line.split(',')[0].strip()
+                    if channel_name and "#genre#" not in line:
+                        self.category_index.setdefault(channel_name, category)
+        
+        print(f"Category index: {len(self.category_index)} channels in "
+              f"{len(set(self.category_index.values()))} categories")
+
+    def get_category_lines(self, category: str) -> List[str]:
+        """Return the line container for a category"""
+        attr = self.category_containers.get(category)
+        if attr:
+            return getattr(self, attr)
+        return self.local_lines.setdefault(category, [])
+
     def final_categorization(self):
         """最终分类处理，每个频道只保留最快的前5个源"""
         # 清空原有的分类容器
@@ -220,17 +283,12 @@ class TVChannelProcessor:
             # 获取最快的前5个源
             top_sources = self.get_top_sources(sources, 5)
             
-            for line in top_sources:
-                # 根据频道名称进行分类
-                if channel_name in self.ys_dictionary:
-                    self.ys_lines.append(line)
-                elif channel_name in self.ws_dictionary:
-                    self.ws_lines.append(line)
-                elif channel_name in self.newtv_dictionary:
-                    self.newtv_lines.append(line)
-                # ... 其他分类条件
-                else:
-                    self.other_lines.append(line)
+            # 根据频道名称进行分类（一次哈希查找）
+            category = self.category_index.get(channel_name)
+            if category is None:
+                self.other_lines.extend(top_sources)
+            else:
+                self.get_category_lines(category).extend(top_sources)
 
     def process_url(self, url: str):
         """Process a URL to extract channel information"""
@@ -340,6 +398,7 @@ class TVChannelProcessor:
         self.ys_dictionary = self.read_txt_to_array('主频道/央视频道.txt')
         self.ws_dictionary = self.read_txt_to_array('主频道/卫视频道.txt')
         # ... load other dictionaries
+        self.build_category_index()
         
         # Load name corrections
         self.corrections_name = self.load_corrections_name('assets/corrections_name.txt')
@@ -400,10 +459,15 @@ class TVChannelProcessor:
         ] + self.read_txt_to_array('专区/卫视频道.txt') + self.sort_data(self.ws_dictionary, self.ws_lines) + ['\n']
         # ... continue building the content
         
-        # Generate content for full version
-        all_lines = all_lines_simple + [
-            # ... add more categories
-        ]
+        # Generate content for full version: every other category with channels gets its own group
+        all_lines = list(all_lines_simple)
+        for category, attr in self.category_containers.items():
+            if category not in self.lite_categories and getattr(self, attr):
+                all_lines += [f"{category},#genre#"] + getattr(self, attr) + ['\n']
+        for category in self.local_categories:
+            if self.local_lines.get(category):
+                all_lines += [f"{category},#genre#"] + self.local_lines[category] + ['\n']
+        self.check_output_coverage(all_lines)
         
         # Write files
         try:
@@ -422,6 +486,16 @@ class TVChannelProcessor:
         except Exception as e:
             print(f"保存文件时发生错误：{e}")
 
+    def check_output_coverage(self, all_lines: List[str]) -> List[str]:
+        """Categorized lines that made it into neither live.txt nor others.txt"""
+        written = set(all_lines) | set(self.other_lines)
+        categorized = [line for attr in self.category_containers.values() for line in getattr(self, attr)]
+        categorized += [line for lines in self.local_lines.values() for line in lines]
+        missing = [line for line in categorized if line not in written]
+        if missing:
+            print(f"警告: {len(missing)} 条已分类的频道未写入任何输出文件，例如: {missing[:5]}")
+        return missing
+
     def print_statistics(self):
         """Print execution statistics"""
         timeend = datetime.now()
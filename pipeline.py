@@ -0,0 +1,97 @@
+"""Single entry point for a full update: fetch every upstream playlist once, check the sources, then
+rank them and write live.txt/live.m3u.
+
+Stages hand their results to the next one in memory. Each stage also leaves its artifacts on disk
+(.cache/pipeline/sources.json for fetch, the checker's whitelist_auto.txt/blacklist_auto.txt for check),
+so any stage can be run on its own and picks up from the previous stage's artifacts:
+
+    python pipeline.py                  # fetch, check, rank
+    python pipeline.py --stage check    # re-check using the last fetch
+    python pipeline.py --stage rank     # re-rank using the last fetch and check
+
+Run from the repository root, like main.py.
+"""
+import argparse
+import importlib.util
+import json
+import os
+from typing import Dict, List, Optional
+
+from main import TVChannelProcessor
+from playlist_parser import Record
+from prober import CheckResult
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CHECKER_FILE = os.path.join(ROOT, 'assets', 'whitelist-blacklist', 'main.py')
+SOURCES_FILE = os.path.join(ROOT, '.cache', 'pipeline', 'sources.json')
+STAGES = ('fetch', 'check', 'rank')
+
+Sources = Dict[str, Optional[List[Record]]]  # {source url: records, or None if the fetch failed}, urls.txt order
+
+
+def load_checker():
+    """Import the checker script as a module (its file name clashes with main.py here)"""
+    spec = importlib.util.spec_from_file_location('whitelist_checker', CHECKER_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def save_sources(sources: Sources, path: str = SOURCES_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump([[url, None if records is None else [list(record) for record in records]]
+                   for url, records in sources.items()], f, ensure_ascii=False)
+    os.replace(tmp_file, path)
+
+
+def load_sources(path: str = SOURCES_FILE) -> Optional[Sources]:
+    """The last fetch stage's output, or None if there is none"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        return None
+    return {url: None if records is None else [Record(*record) for record in records]
+            for url, records in entries}
+
+
+def fetch(processor: TVChannelProcessor) -> Sources:
+    urls = processor.read_txt_to_array('assets/urls.txt')
+    sources = processor.fetch_sources([url for url in urls if url.startswith("http")])
+    processor.fetch_cache.save()
+    save_sources(sources)
+    return sources
+
+
+def check(sources: Optional[Sources]) -> CheckResult:
+    checker = load_checker()
+    if sources is None:
+        print(f"No fetch stage output at {SOURCES_FILE}, the checker fetches its own sources")
+        checker.fetch_sources(checker.read_txt_to_array('assets/urls.txt'))
+    else:
+        for url, records in sources.items():
+            if records is not None:
+                checker.add_source_records(url, records)
+    return checker.run_check(checker.urls_all_lines)
+
+
+def run(stages=STAGES):
+    processor = TVChannelProcessor()
+    sources = fetch(processor) if 'fetch' in stages else load_sources()
+    checked = check(sources) if 'check' in stages else None
+    if 'rank' in stages:
+        # Without a check stage in this run, main.py reads the checker's files as usual
+        processor.run(fetched=sources, checked=checked)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch, check and rank live sources in one run")
+    parser.add_argument('--stage', choices=STAGES, action='append',
+                        help="run only this stage, resuming from the previous stages' artifacts (repeatable)")
+    args = parser.parse_args()
+    run(args.stage or STAGES)
@@ -0,0 +1,122 @@
+import codecs
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+ENCODINGS = ['utf-8', 'gbk', 'iso-8859-1']  # Tried in order; iso-8859-1 never fails
+URL_PREFIXES = ("http", "rtmp", "p3p")  # M3U URL lines kept after an #EXTINF
+TXT_LINE_PATTERN = re.compile(r'^[^,]+,[^\s]+://[^\s]+$')  # "name,url" lines mixed into M3U files
+# #EXTINF:<duration> key="value" key=value ...,<title>; commas inside quoted values don't end the attributes
+# Attributes must be whitespace-separated, which keeps matching linear
+EXTINF_PATTERN = re.compile(r'#EXTINF:\s*[^\s,"]*((?:\s+[\w-]+=(?:"[^"]*"|[^\s,"]*))*)\s*,(.*)')
+ATTRIBUTE_PATTERN = re.compile(r'([\w-]+)=(?:"([^"]*)"|([^\s,"]*))')
+
+
+class Record(NamedTuple):
+    name: str
+    url: str
+    tvg_id: str = ''
+    tvg_name: str = ''
+    group: str = ''  # group-title
+
+
+def parse_extinf(line: str) -> Record:
+    """Title and tvg-id/tvg-name/group-title of an #EXTINF line, as a Record without a URL.
+    Commas in the title are kept, as full-width commas so "name,url" lines stay splittable"""
+    match = EXTINF_PATTERN.match(line.strip())
+    if not match:
+        return Record(line.split(',')[-1].strip(), '')
+    attributes: Dict[str, str] = {key.lower(): quoted or bare
+                                  for key, quoted, bare in ATTRIBUTE_PATTERN.findall(match.group(1))}
+    return Record(match.group(2).strip().replace(',', '，'), '', attributes.get('tvg-id', '').strip(),
+                  attributes.get('tvg-name', '').strip(), attributes.get('group-title', '').strip())
+
+
+class PlaylistStreamParser:
+    """Incremental M3U/TXT playlist parser: feed it body chunks as they arrive and it returns the
+    records completed so far. The format is detected from the first non-blank line"""
+
+    def __init__(self):
+        self.encoding_index = 0
+        self.decoder = codecs.getincrementaldecoder(ENCODINGS[0])()
+        self.pending = ''  # Decoded text after the last newline
+        self.format: Optional[str] = None  # 'm3u' or 'txt' once detected
+        self.extinf = Record('', '')  # Title and attributes from the last #EXTINF
+        self.line_count = 0
+
+    @property
+    def encoding(self) -> str:
+        return ENCODINGS[self.encoding_index]
+
+    def decode(self, chunk: bytes, final: bool = False) -> str:
+        """Decode a chunk, falling back to the next encoding for the rest of the stream on errors"""
+        while True:
+            try:
+                return self.decoder.decode(chunk, final)
+            except UnicodeDecodeError:
+                buffered, _ = self.decoder.getstate()  # Bytes of a partial character from the previous chunk
+                chunk = buffered + chunk
+                self.encoding_index += 1
+                self.decoder = codecs.getincrementaldecoder(self.encoding)()
+
+    def feed(self, chunk: bytes) -> List[Record]:
+        text = self.pending + self.decode(chunk)
+        lines = text.split('\n')
+        self.pending = lines.pop()
+        return self.parse_lines(lines)
+
+    def close(self) -> List[Record]:
+        """Flush the last (unterminated) line"""
+        text = self.pending + self.decode(b'', final=True)
+        self.pending = ''
+        return self.parse_lines([text]) if text else []
+
+    def parse_lines(self, lines: List[str]) -> List[Record]:
+        records = []
+        for line in lines:
+            self.line_count += 1
+            if self.format is None:
+                first = line.lstrip('\ufeff').strip()
+                if not first:
+                    continue
+                self.format = 'm3u' if first.startswith(('#EXTM3U', '#EXTINF')) else 'txt'
+            if self.format == 'm3u':
+                if line.startswith("#EXTM3U"):
+                    continue
+                if line.startswith("#EXTINF"):
+                    self.extinf = parse_extinf(line)
+                elif line.startswith(URL_PREFIXES) and "://" in line and "#genre#" not in line:
+                    records.append(self.extinf._replace(url=line.strip()))
+                # M3U files with TXT content
+                if "#genre#" not in line and "," in line and "://" in line and TXT_LINE_PATTERN.match(line):
+                    name, url = line.split(',', 1)
+                    records.append(Record(name.strip(), url.strip()))
+            elif "#genre#" not in line and "," in line and "://" in line:
+                name, url = line.split(',', 1)
+                records.append(Record(name.strip(), url.strip()))
+        return records
+
+
+class SourceExpander:
+    """Splits '#'-joined multi-URL sources (url1#url2#url3) into separate candidate URLs, counting
+    how many addresses were expanded and how many fragments that produced"""
+
+    def __init__(self):
+        self.lines_expanded = 0
+        self.fragments = 0
+
+    def expand(self, address: str) -> List[str]:
+        if '#' not in address:
+            return [address]
+        fragments = [fragment for fragment in address.split('#') if '://' in fragment]
+        if fragments:
+            self.lines_expanded += 1
+            self.fragments += len(fragments)
+        return fragments
+
+
+def iter_records(chunks: Iterable[bytes], parser: PlaylistStreamParser = None) -> Iterator[Record]:
+    """Yield records from a stream of body chunks as soon as each line is complete"""
+    parser = parser or PlaylistStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
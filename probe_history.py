@@ -0,0 +1,152 @@
+import math
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Kept out of git (it grows to hundreds of MB); both workflows restore .cache/ with actions/cache
+DEFAULT_HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'probe_history.db')
+# Where earlier versions kept it; moved to DEFAULT_HISTORY_FILE on first use
+LEGACY_HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   'assets', 'whitelist-blacklist', 'probe_history.db')
+MAX_SAMPLES_PER_URL = 20  # Older samples are pruned
+MAX_SAMPLE_AGE_DAYS = 30
+EWMA_ALPHA = 0.3  # Weight of the newest sample
+# Adaptive timeouts: p99 of a host's successful latencies x TIMEOUT_FACTOR, clamped by the caller's floor/ceiling
+TIMEOUT_PERCENTILE = 0.99
+TIMEOUT_FACTOR = 3
+MIN_TIMEOUT_SAMPLES = 3  # Fewer successful samples than this and the caller's default applies
+
+
+@dataclass
+class URLStats:
+    url: str
+    samples: int
+    successes: int
+    success_ratio: float
+    ewma_ms: Optional[float]  # Over successful probes only, oldest to newest
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    last_ts: float
+    last_success: bool
+    throughput_kbps: Optional[float] = None  # Median HLS first-segment download rate
+    sustain_ratio: Optional[float] = None  # Median download rate / stream bitrate
+
+    @property
+    def score(self) -> float:
+        """Ranking key, lower is better: typical latency inflated by the failure rate,
+        and by how far the source falls short of sustaining its bitrate"""
+        if not self.successes:
+            return float('inf')
+        score = (self.ewma_ms + self.p95_ms) / 2 / self.success_ratio
+        if self.sustain_ratio is not None:
+            score /= min(1.0, max(self.sustain_ratio, 0.05))
+        return score
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def adaptive_timeout(latencies_ms: List[float], default: float, floor: float, ceiling: float,
+                     factor: float = TIMEOUT_FACTOR) -> float:
+    """Timeout in seconds for a host with these observed latencies (milliseconds)"""
+    if len(latencies_ms) < MIN_TIMEOUT_SAMPLES:
+        return default
+    p99 = percentile(sorted(latencies_ms), TIMEOUT_PERCENTILE)
+    return min(ceiling, max(floor, p99 * factor / 1000))
+
+
+class ProbeHistory:
+    """SQLite store of probe results per URL: timestamp, latency, success, bytes and HLS throughput"""
+
+    def __init__(self, db_file: str = DEFAULT_HISTORY_FILE):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        if db_file == DEFAULT_HISTORY_FILE and not os.path.exists(db_file) and os.path.exists(LEGACY_HISTORY_FILE):
+            os.replace(LEGACY_HISTORY_FILE, db_file)
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS probes (
+                url TEXT NOT NULL,
+                host TEXT NOT NULL,
+                ts REAL NOT NULL,
+                latency_ms REAL,
+                success INTEGER NOT NULL,
+                bytes INTEGER NOT NULL DEFAULT 0
+            )""")
+        # Columns added after the first release
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(probes)")}
+        for column in ('ttfb_ms', 'throughput_kbps', 'bandwidth_kbps'):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE probes ADD COLUMN {column} REAL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS probes_url_ts ON probes (url, ts)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS probes_host_ts ON probes (host, ts)")
+
+    def record(self, rows: Iterable[Tuple]):
+        """Append (url, host, ts, latency_ms, success, bytes, ttfb_ms, throughput_kbps, bandwidth_kbps) rows"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO probes (url, host, ts, latency_ms, success, bytes, ttfb_ms, throughput_kbps, bandwidth_kbps)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((url, host, ts, latency, int(success), size, ttfb, kbps, bandwidth)
+                 for url, host, ts, latency, success, size, ttfb, kbps, bandwidth in rows))
+
+    def prune(self):
+        """Keep the newest MAX_SAMPLES_PER_URL samples per URL, none older than MAX_SAMPLE_AGE_DAYS"""
+        cutoff = time.time() - MAX_SAMPLE_AGE_DAYS * 86400
+        with self.conn:
+            self.conn.execute("DELETE FROM probes WHERE ts < ?", (cutoff,))
+            self.conn.execute("""
+                DELETE FROM probes WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (PARTITION BY url ORDER BY ts DESC) AS n FROM probes
+                    ) WHERE n > ?
+                )""", (MAX_SAMPLES_PER_URL,))
+        self.conn.execute("VACUUM")
+
+    def stats(self) -> Dict[str, URLStats]:
+        """Aggregate EWMA, p50/p95 latency and success ratio for every URL in the store"""
+        samples: Dict[str, List[Tuple]] = {}
+        for url, ts, latency, success, kbps, bandwidth in self.conn.execute(
+                "SELECT url, ts, latency_ms, success, throughput_kbps, bandwidth_kbps FROM probes ORDER BY url, ts"):
+            samples.setdefault(url, []).append((ts, latency, success, kbps, bandwidth))
+
+        result = {}
+        for url, rows in samples.items():
+            latencies = [latency for _, latency, success, _, _ in rows if success and latency is not None]
+            rates = sorted(kbps for _, _, success, kbps, _ in rows if success and kbps is not None)
+            ratios = sorted(kbps / bandwidth for _, _, success, kbps, bandwidth in rows
+                            if success and kbps is not None and bandwidth)
+            ewma = None
+            for latency in latencies:
+                ewma = latency if ewma is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * ewma
+            ordered = sorted(latencies)
+            result[url] = URLStats(
+                url=url,
+                samples=len(rows),
+                successes=len(latencies),
+                success_ratio=len(latencies) / len(rows),
+                ewma_ms=ewma,
+                p50_ms=percentile(ordered, 0.5) if ordered else None,
+                p95_ms=percentile(ordered, 0.95) if ordered else None,
+                last_ts=rows[-1][0],
+                last_success=bool(rows[-1][2]),
+                throughput_kbps=percentile(rates, 0.5) if rates else None,
+                sustain_ratio=percentile(ratios, 0.5) if ratios else None,
+            )
+        return result
+
+    def host_latencies(self) -> Dict[str, List[float]]:
+        """Latencies of all successful probes per host still in the store"""
+        latencies: Dict[str, List[float]] = {}
+        for host, latency in self.conn.execute(
+                "SELECT host, latency_ms FROM probes WHERE success AND latency_ms IS NOT NULL"):
+            latencies.setdefault(host, []).append(latency)
+        return latencies
+
+    def close(self):
+        self.conn.close()
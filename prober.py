@@ -0,0 +1,638 @@
+import asyncio
+import re
+import ssl
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urljoin, urlparse
+
+from dns_cache import DNSCache
+from ffprobe_scheduler import FFprobeScheduler
+
+USER_AGENT = 'PostmanRuntime-ApipostRuntime/1.1.0'
+# Everything printable except space stays as-is; only spaces and non-ASCII (e.g. 汉字) are percent-encoded
+SAFE_URL_CHARS = ''.join(chr(c) for c in range(33, 127))
+MAX_REDIRECTS = 5
+CONNECT_TIMEOUT = 3  # Phase one (TCP connect prefilter) timeout in seconds, unless the host learned a longer one
+PLAYLIST_BYTE_CAP = 256 * 1024
+SEGMENT_BYTE_CAP = 512 * 1024  # First HLS segment is downloaded up to this many bytes
+BANDWIDTH_PATTERN = re.compile(r'BANDWIDTH=(\d+)')
+POOL_IDLE_TIMEOUT = 15  # Idle keep-alive connections older than this are closed
+POOL_MAX_IDLE = 256  # Idle keep-alive connections kept across all endpoints; the least recently used go first
+DRAIN_LIMIT = 64 * 1024  # Unwanted bodies up to this size are read off so the connection stays reusable
+
+
+@dataclass
+class ProbeResult:
+    url: str
+    protocol: str
+    success: bool = False
+    connect_ms: Optional[float] = None  # Phase one: TCP connect time to the URL's endpoint
+    elapsed_ms: Optional[float] = None  # Phase two: wall time of the full probe, set whenever it ran to completion
+    error: str = ''  # Exception text when the probe raised (timeout, refused, ...)
+    bytes_read: int = 0  # Payload bytes received, where the probe type reads any
+    reused: bool = False  # HTTP: first request went over a pooled keep-alive connection (no connect/TLS handshake)
+    ts: float = 0.0  # Unix time the probe finished
+    timeout: Optional[float] = None  # Seconds allowed for this probe (per-host adaptive or the default)
+    hedged: bool = False  # The result came from a second attempt started after the host's p50 latency
+    hedge_elapsed_ms: Optional[float] = None  # Hedged: the second attempt's own time; elapsed_ms counts from the first
+    # HTTP/HLS metrics
+    ttfb_ms: Optional[float] = None  # Request sent -> response headers, for the (first) playlist or plain GET
+    segment_ttfb_ms: Optional[float] = None
+    segment_duration: Optional[float] = None  # Seconds, from #EXTINF
+    throughput_kbps: Optional[float] = None  # First segment download rate
+    bandwidth_kbps: Optional[float] = None  # Stream bitrate: declared BANDWIDTH, else measured from a whole segment
+    # rtmp/rtsp stream info from ffprobe
+    codec: str = ''
+    resolution: str = ''
+    from_cache: bool = False  # Reused a fresh ffprobe result from an earlier run
+
+    @property
+    def sustain_ratio(self) -> Optional[float]:
+        """Download rate over stream bitrate; below 1 the source cannot keep up with playback"""
+        if self.throughput_kbps is None or not self.bandwidth_kbps:
+            return None
+        return self.throughput_kbps / self.bandwidth_kbps
+
+
+class CheckedSource(NamedTuple):
+    """A source that passed the checker, as handed to the aggregator"""
+    latency_ms: float
+    name: str
+    url: str
+
+
+class CheckResult(NamedTuple):
+    success: List[CheckedSource]  # Fastest first
+    blacklist: List[str]  # URLs that failed
+
+
+@dataclass
+class HTTPResponse:
+    url: str  # Final URL after redirects
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    ttfb_ms: float
+    body_ms: float
+    reused: bool = False
+
+
+@dataclass
+class ConnectResult:
+    reachable: bool
+    connect_ms: Optional[float] = None
+    error: str = ''
+
+
+def parse_hls_playlist(text: str, base_url: str) -> Optional[Tuple[List[Tuple[int, str]], List[Tuple[float, str]]]]:
+    """Return ([(bandwidth, variant_url)], [(duration, segment_url)]), or None if text is not HLS"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or not lines[0].lstrip('\ufeff').startswith('#EXTM3U'):
+        return None
+    variants, segments = [], []
+    bandwidth, duration = None, None
+    for line in lines[1:]:
+        if line.startswith('#EXT-X-STREAM-INF'):
+            match = BANDWIDTH_PATTERN.search(line)
+            bandwidth = int(match.group(1)) if match else 0
+        elif line.startswith('#EXTINF:'):
+            try:
+                duration = float(line[len('#EXTINF:'):].split(',')[0])
+            except ValueError:
+                duration = 0.0
+        elif not line.startswith('#'):
+            if bandwidth is not None:
+                variants.append((bandwidth, urljoin(base_url, line)))
+            elif duration is not None:
+                segments.append((duration, urljoin(base_url, line)))
+            bandwidth, duration = None, None
+    return variants, segments
+
+
+class RateLimiter:
+    """Token bucket limiting how many probes may start per second"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class UDPProbeProtocol(asyncio.DatagramProtocol):
+    """Resolves a future with the first datagram received"""
+
+    def __init__(self):
+        self.received = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        if not self.received.done():
+            self.received.set_result(data)
+
+    def error_received(self, exc):
+        if not self.received.done():
+            self.received.set_exception(exc)
+
+
+class ConnectionPool:
+    """Idle keep-alive HTTP/1.1 connections per (scheme, host, port), at most max_per_host open at once.
+    At most max_idle idle connections are kept overall (least recently used closed first), and connections
+    idle for longer than POOL_IDLE_TIMEOUT are closed on the next put() or take() for any endpoint"""
+
+    def __init__(self, max_per_host: int = 8, max_idle: int = POOL_MAX_IDLE):
+        self.max_per_host = max_per_host
+        self.max_idle = max_idle
+        self.idle: Dict[Tuple[str, str, int], List[Tuple[asyncio.StreamReader, asyncio.StreamWriter, float]]] = {}
+        # Every idle connection, least recently used first: {writer: (endpoint, last used)}
+        self.lru: OrderedDict[asyncio.StreamWriter, Tuple[Tuple[str, str, int], float]] = OrderedDict()
+        self.slots: Dict[Tuple[str, str, int], asyncio.Semaphore] = {}
+        self.opened = 0
+        self.reused = 0
+        self.evicted = 0  # Idle connections closed for max_idle or POOL_IDLE_TIMEOUT
+
+    def slot(self, endpoint: Tuple[str, str, int]) -> asyncio.Semaphore:
+        if endpoint not in self.slots:
+            self.slots[endpoint] = asyncio.Semaphore(self.max_per_host)
+        return self.slots[endpoint]
+
+    def evict_oldest(self):
+        writer, (endpoint, _) = self.lru.popitem(last=False)
+        connections = self.idle[endpoint]
+        connections[:] = [connection for connection in connections if connection[1] is not writer]
+        if not connections:
+            del self.idle[endpoint]
+        writer.close()
+        self.evicted += 1
+
+    def prune(self, now: float):
+        """Close connections idle past POOL_IDLE_TIMEOUT, whichever endpoint they belong to"""
+        while self.lru and now - next(iter(self.lru.values()))[1] >= POOL_IDLE_TIMEOUT:
+            self.evict_oldest()
+
+    def take(self, endpoint: Tuple[str, str, int]) -> Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]:
+        """Most recently used idle connection that still looks alive"""
+        self.prune(time.monotonic())
+        connections = self.idle.get(endpoint, [])
+        while connections:
+            reader, writer, _ = connections.pop()
+            del self.lru[writer]
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        return None
+
+    def put(self, endpoint: Tuple[str, str, int], reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        now = time.monotonic()
+        self.prune(now)
+        connections = self.idle.setdefault(endpoint, [])
+        if len(connections) >= self.max_per_host:
+            writer.close()
+            return
+        connections.append((reader, writer, now))
+        self.lru[writer] = (endpoint, now)
+        while len(self.lru) > self.max_idle:
+            self.evict_oldest()
+
+    def close(self):
+        for connections in self.idle.values():
+            for _, writer, _ in connections:
+                writer.close()
+        self.idle.clear()
+        self.lru.clear()
+
+
+class AsyncProber:
+    """Asyncio stream prober: thousands of probes in flight, bounded per host and by a global start rate"""
+
+    def __init__(self, timeout: float = 6, max_concurrency: int = 2000, per_host_limit: int = 8,
+                 rate_limit: float = 500, hls_mode: bool = True, ffprobe: FFprobeScheduler = None,
+                 dns: DNSCache = None, pool_size: int = None, pool_max_idle: int = POOL_MAX_IDLE,
+                 timeouts: Dict[str, float] = None, hedge_delays: Dict[str, float] = None, hedge_budget: float = 0.0):
+        self.timeout = timeout  # Default for hosts without a learned timeout
+        self.timeouts = timeouts or {}  # {netloc: seconds}
+        # Hedging: a probe still running after its host's delay (p50 latency) gets a second attempt on a new
+        # connection, as long as hedges stay under hedge_budget x probes started and the host has a free
+        # per_host_limit slot for it. 0 disables it
+        self.hedge_delays = hedge_delays or {}  # {netloc: seconds}
+        self.hedge_budget = hedge_budget
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.pool = ConnectionPool(pool_size or per_host_limit, pool_max_idle)
+        self.dns = dns or DNSCache()
+        self.ffprobe = ffprobe or FFprobeScheduler(timeout=timeout)
+        self.hls_mode = hls_mode
+        self.per_host_limit = per_host_limit
+        self.global_semaphore = asyncio.Semaphore(max_concurrency)
+        self.host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.ssl_context = ssl.create_default_context()
+        self.dns_tasks: Dict[str, asyncio.Future] = {}  # One lookup per hostname per run, through the shared DNS cache
+        self.endpoints: Dict[Tuple[str, str, int], ConnectResult] = {}  # Phase one results
+
+    def close(self):
+        """Close pooled keep-alive connections"""
+        self.pool.close()
+
+    @staticmethod
+    def endpoint(parsed) -> Tuple[str, str, int]:
+        scheme = parsed.scheme.lower()
+        return scheme, parsed.hostname, parsed.port or (443 if scheme == 'https' else 80)
+
+    async def resolve(self, host: str) -> List[str]:
+        """Resolve a hostname once and share its addresses between both phases"""
+        if host not in self.dns_tasks:
+            self.dns_tasks[host] = asyncio.ensure_future(self._resolve(host))
+        return await asyncio.shield(self.dns_tasks[host])
+
+    async def _resolve(self, host: str) -> List[str]:
+        return await self.dns.resolve_async(host)
+
+    async def connect(self, host: str, port: int, **kwargs) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """asyncio.open_connection to host, trying each of its addresses in turn"""
+        error = None
+        for address in await self.resolve(host):
+            try:
+                return await asyncio.open_connection(address, port, **kwargs)
+            except OSError as e:
+                error = e
+        raise error
+
+    async def preresolve(self, urls: Iterable[str]) -> int:
+        """Resolve every distinct host in parallel before probing, returning how many failed"""
+        hosts = {urlparse(url).hostname for url in urls}
+        return await asyncio.get_running_loop().run_in_executor(None, self.dns.prefetch, hosts)
+
+    async def connect_endpoint(self, endpoint: Tuple[str, str, int], timeout: float = CONNECT_TIMEOUT) -> ConnectResult:
+        """Phase one: plain TCP connect, no request sent. timeout covers the DNS lookup and the connect together"""
+        _, host, port = endpoint
+        async with self.global_semaphore:
+            start_time = time.monotonic()
+            try:
+                _, writer = await asyncio.wait_for(self.connect(host, port), timeout=timeout)
+                writer.close()
+                return ConnectResult(True, (time.monotonic() - start_time) * 1000)
+            except asyncio.TimeoutError:
+                return ConnectResult(False, error=f"connect timed out after {timeout:g}s")
+            except Exception as e:
+                return ConnectResult(False, error=str(e) or type(e).__name__)
+
+    async def prefilter(self, urls: Iterable[str]):
+        """Phase one for all http(s) URLs: connect to every distinct endpoint in parallel"""
+        # {endpoint: connect timeout}; known-slow hosts keep their learned timeout so they aren't failed here
+        timeouts: Dict[Tuple[str, str, int], float] = {}
+        for url in urls:
+            parsed = urlparse(url)
+            if parsed.scheme.lower() in ('http', 'https') and parsed.hostname:
+                try:
+                    endpoint = self.endpoint(parsed)
+                except ValueError:
+                    continue  # Invalid port
+                timeouts[endpoint] = max(timeouts.get(endpoint, CONNECT_TIMEOUT),
+                                         self.timeouts.get(parsed.netloc, CONNECT_TIMEOUT))
+        endpoints = sorted(timeouts)
+        results = await asyncio.gather(*(self.connect_endpoint(endpoint, timeouts[endpoint]) for endpoint in endpoints))
+        self.endpoints.update(zip(endpoints, results))
+
+    def host_semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self.host_semaphores[host]
+
+    async def probe(self, url: str) -> ProbeResult:
+        """Probe one URL according to its scheme"""
+        parsed = urlparse(url)
+        protocol = parsed.scheme.lower()
+        result = ProbeResult(url, protocol)
+
+        # Hosts known not to exist fail every URL without a timeout
+        error = self.dns.failure(parsed.hostname) if parsed.hostname else None
+        if error:
+            result.error = f"unresolvable: {error}"
+            result.ts = time.time()
+            return result
+
+        # Endpoints that failed phase one fail here without a request
+        if protocol in ('http', 'https'):
+            try:
+                connect = self.endpoints.get(self.endpoint(parsed))
+            except ValueError:
+                connect = None
+            if connect is not None:
+                result.connect_ms = connect.connect_ms
+                if not connect.reachable:
+                    result.error = f"unreachable: {connect.error}"
+                    result.ts = time.time()
+                    return result
+
+        # ffprobe runs on its own bounded process slots rather than the socket limits
+        if protocol in ('rtmp', 'rtsp'):
+            result.timeout = self.timeouts.get(parsed.netloc, self.timeout)
+            async with self.host_semaphore(parsed.netloc):
+                await self.probe_ffprobe(url, result)
+            return result
+
+        if protocol not in ('http', 'https', 'p3p', 'p2p', 'rtp'):
+            return result
+        result.timeout = self.timeouts.get(parsed.netloc, self.timeout)
+        async with self.host_semaphore(parsed.netloc), self.global_semaphore:
+            await self.rate_limiter.acquire()
+            result = await self.hedged_attempts(result, parsed)
+        result.ts = time.time()
+        return result
+
+    async def attempt(self, result: ProbeResult, parsed) -> ProbeResult:
+        """One try at the probe, filling in result"""
+        start_time = time.monotonic()
+        try:
+            if result.protocol in ('http', 'https'):
+                check = self.probe_http(result.url, result)
+            elif result.protocol in ('p3p', 'p2p'):
+                check = self.probe_tcp(parsed)
+            else:
+                check = self.probe_udp(parsed)
+            result.success = await asyncio.wait_for(check, timeout=result.timeout)
+            result.elapsed_ms = (time.monotonic() - start_time) * 1000
+        except asyncio.TimeoutError:
+            result.error = f"timed out after {result.timeout:g}s"
+        except Exception as e:
+            result.error = str(e) or type(e).__name__
+        return result
+
+    async def hedged_attempts(self, result: ProbeResult, parsed) -> ProbeResult:
+        """Run the probe; if it outlives the host's hedge delay and the budget allows, race a second attempt.
+        The first successful attempt wins, else the first failure is reported. Either way elapsed_ms is
+        timed from the first attempt's start"""
+        self.primaries += 1
+        delay = self.hedge_delays.get(parsed.netloc)
+        if not self.hedge_budget or delay is None or delay >= result.timeout:
+            return await self.attempt(result, parsed)
+
+        start_time = time.monotonic()
+        deadline = start_time + result.timeout
+        template = replace(result)  # Untouched copy for the second attempt
+        tasks = [asyncio.ensure_future(self.attempt(result, parsed))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            # The hedge needs a host slot of its own, so a host at per_host_limit is not hedged
+            if done or self.hedges >= self.hedge_budget * self.primaries or self.host_semaphore(parsed.netloc).locked():
+                return await tasks[0]
+
+            self.hedges += 1
+            second = replace(template, hedged=True)
+            tasks.append(asyncio.ensure_future(self.hedge(second, parsed, deadline)))
+            failed = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done:
+                        attempt = task.result()
+                        if attempt.hedged and attempt.elapsed_ms is not None:
+                            # The probe took as long as the caller waited, primary's head start included
+                            attempt.hedge_elapsed_ms = attempt.elapsed_ms
+                            attempt.elapsed_ms = (time.monotonic() - start_time) * 1000
+                        if attempt.success:
+                            if attempt.hedged:
+                                self.hedge_wins += 1
+                                attempt.timeout = template.timeout  # Report the probe's overall budget
+                            return attempt
+                        failed = failed or attempt
+            return failed
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def hedge(self, result: ProbeResult, parsed, deadline: float) -> ProbeResult:
+        """The second attempt of a hedged probe: its own host slot, and only the time left before the deadline"""
+        async with self.host_semaphore(parsed.netloc):
+            result.timeout = max(deadline - time.monotonic(), 0)
+            return await self.attempt(result, parsed)
+
+    async def open_connection(self, parsed) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        https = parsed.scheme.lower() == 'https'
+        port = parsed.port or (443 if https else 80)
+        return await self.connect(
+            parsed.hostname, port,
+            ssl=self.ssl_context if https else None,
+            server_hostname=parsed.hostname if https else None)
+
+    async def read_body(self, reader: asyncio.StreamReader, status: int, headers: Dict[str, str],
+                        max_body: int) -> Tuple[bytes, bool]:
+        """Read up to max_body bytes of a response body (chunked, Content-Length or until close).
+        Also returns whether the whole body was consumed, i.e. the connection can carry another request"""
+        if status < 200 or status in (204, 304):
+            return b'', True
+        limit = max(max_body, DRAIN_LIMIT)
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            body = bytearray()
+            while len(body) < limit:
+                size = int(((await reader.readline()).split(b';')[0].strip() or b'0'), 16)
+                if size == 0:
+                    while (await reader.readline()).strip():
+                        pass  # Trailer headers
+                    return bytes(body[:max_body]), True
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)  # CRLF after each chunk
+            return bytes(body[:max_body]), False
+        if 'content-length' in headers:
+            length = int(headers['content-length'])
+            if length <= limit:
+                return (await reader.readexactly(length))[:max_body], True
+            return await reader.readexactly(min(length, max_body)), False
+        body = bytearray()
+        while len(body) < max_body:
+            chunk = await reader.read(min(65536, max_body - len(body)))
+            if not chunk:
+                break
+            body += chunk
+        return bytes(body), False
+
+    async def exchange(self, endpoint: Tuple[str, str, int], reader: asyncio.StreamReader,
+                       writer: asyncio.StreamWriter, request: bytes, url: str, max_body: int,
+                       reused: bool) -> HTTPResponse:
+        """One request/response on an open connection, which goes back to the pool if it can be reused"""
+        keep_alive = False
+        try:
+            start_time = time.monotonic()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            ttfb_ms = (time.monotonic() - start_time) * 1000
+
+            lines = head.decode('latin-1').split('\r\n')
+            version, status = lines[0].split(' ', 2)[:2]
+            status = int(status)
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            body, complete = await self.read_body(reader, status, headers, max_body if status == 200 else 0)
+            body_ms = (time.monotonic() - start_time) * 1000 - ttfb_ms
+            connection = headers.get('connection', '').lower()
+            keep_alive = complete and (connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close')
+        finally:
+            if keep_alive:
+                self.pool.put(endpoint, reader, writer)
+            else:
+                writer.close()
+        return HTTPResponse(url, status, headers, body, ttfb_ms, body_ms, reused)
+
+    async def http_request(self, url: str, max_body: int = 0, fresh: bool = False) -> HTTPResponse:
+        """Send a GET over a pooled keep-alive connection (a new one if fresh); read the status, headers and
+        at most max_body bytes"""
+        parsed = urlparse(url)
+        target = quote(parsed.path or '/', safe=SAFE_URL_CHARS)
+        if parsed.query:
+            target += '?' + quote(parsed.query, safe=SAFE_URL_CHARS)
+        host_header = parsed.netloc.rsplit('@', 1)[-1]
+        request = (
+            f"GET {target} HTTP/1.1\r\n"
+            f"Host: {host_header}\r\n"
+            f"User-Agent: {USER_AGENT}\r\n"
+            f"Accept: */*\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        ).encode('latin-1')
+
+        endpoint = self.endpoint(parsed)
+        async with self.pool.slot(endpoint):
+            idle = None if fresh else self.pool.take(endpoint)
+            if idle:
+                try:
+                    response = await self.exchange(endpoint, *idle, request, url, max_body, reused=True)
+                    self.pool.reused += 1
+                    return response
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    pass  # The server dropped the idle connection; GET is safe to retry on a fresh one
+            reader, writer = await self.open_connection(parsed)
+            self.pool.opened += 1
+            return await self.exchange(endpoint, reader, writer, request, url, max_body, reused=False)
+
+    async def http_get(self, url: str, max_body: int = 0, fresh: bool = False) -> HTTPResponse:
+        """GET following redirects like urlopen; raises on error statuses"""
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self.http_request(url, max_body, fresh)
+            if response.status in (301, 302, 303, 307, 308) and 'location' in response.headers:
+                url = urljoin(url, response.headers['location'])
+                continue
+            if 200 <= response.status < 300:
+                return response
+            raise ValueError(f"HTTP Error {response.status}")
+        raise ValueError("too many redirects")
+
+    async def probe_http(self, url: str, result: ProbeResult) -> bool:
+        """HTTP(S) probe; success means a final 200. .m3u8 URLs get the HLS probe when hls_mode is on.
+        A hedge opens new connections rather than taking idle pooled ones"""
+        if self.hls_mode and urlparse(url).path.lower().endswith('.m3u8'):
+            return await self.probe_hls(url, result)
+        response = await self.http_get(url, fresh=result.hedged)
+        result.ttfb_ms = response.ttfb_ms
+        result.reused = response.reused
+        return response.status == 200
+
+    async def probe_hls(self, url: str, result: ProbeResult) -> bool:
+        """Fetch the (master then) media playlist and the first segment, recording TTFB and throughput"""
+        response = await self.http_get(url, PLAYLIST_BYTE_CAP, result.hedged)
+        result.ttfb_ms = response.ttfb_ms
+        result.reused = response.reused
+        if response.status != 200:
+            return False
+        playlist = parse_hls_playlist(response.body.decode('utf-8', 'replace'), response.url)
+        if playlist is None:
+            return True  # Not actually HLS (e.g. a raw stream behind .m3u8): plain HTTP 200 semantics
+
+        variants, segments = playlist
+        if variants:
+            result.bandwidth_kbps = variants[0][0] / 1000 or None
+            response = await self.http_get(variants[0][1], PLAYLIST_BYTE_CAP, result.hedged)
+            playlist = parse_hls_playlist(response.body.decode('utf-8', 'replace'), response.url)
+            if playlist is None:
+                raise ValueError("variant is not a media playlist")
+            segments = playlist[1]
+        if not segments:
+            raise ValueError("media playlist has no segments")
+
+        duration, segment_url = segments[0]
+        segment = await self.http_get(segment_url, SEGMENT_BYTE_CAP, result.hedged)
+        if not segment.body:
+            raise ValueError("empty first segment")
+        result.segment_duration = duration
+        result.segment_ttfb_ms = segment.ttfb_ms
+        result.bytes_read = len(segment.body)
+        result.throughput_kbps = len(segment.body) * 8 / max(segment.body_ms, 1)  # bits per ms == kbit/s
+        # Without a declared BANDWIDTH, a fully downloaded segment gives the stream bitrate
+        if result.bandwidth_kbps is None and duration and len(segment.body) < SEGMENT_BYTE_CAP:
+            result.bandwidth_kbps = len(segment.body) * 8 / 1000 / duration
+        return True
+
+    async def probe_tcp(self, parsed) -> bool:
+        """Raw TCP probe for p3p/p2p sources"""
+        host = parsed.hostname
+        port = parsed.port or (80 if parsed.scheme == "http" else 443)
+        path = parsed.path or "/"
+        if not host or not port:
+            raise ValueError(f"Invalid {parsed.scheme} URL")
+
+        reader, writer = await self.connect(host, port)
+        try:
+            if parsed.scheme == 'p3p':
+                request = (
+                    f"GET {path} P3P/1.0\r\n"
+                    f"Host: {host}\r\n"
+                    f"User-Agent: CustomClient/1.0\r\n"
+                    f"Connection: close\r\n\r\n"
+                )
+                expected = b"P3P"
+            else:
+                # Placeholder request/response, to be replaced by the real p2p protocol
+                request = f"YOUR_CUSTOM_REQUEST {path}\r\nHost: {host}\r\n\r\n"
+                expected = b"SOME_EXPECTED_RESPONSE"
+            writer.write(request.encode())
+            await writer.drain()
+            response = await reader.read(1024)
+            return expected in response
+        finally:
+            writer.close()
+
+    async def probe_udp(self, parsed) -> bool:
+        """rtp: send an empty datagram and wait for any data back"""
+        if not parsed.hostname or not parsed.port:
+            raise ValueError("Invalid rtp URL")
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            UDPProbeProtocol, remote_addr=((await self.resolve(parsed.hostname))[0], parsed.port))
+        try:
+            transport.sendto(b'')
+            await protocol.received
+            return True
+        finally:
+            transport.close()
+
+    async def probe_ffprobe(self, url: str, result: ProbeResult):
+        """rtmp/rtsp: stream info from the ffprobe scheduler, reusing a fresh cached result"""
+        info = self.ffprobe.cached(url)
+        result.from_cache = info is not None
+        if info is None:
+            info = await self.ffprobe.run(url, result.timeout)
+        result.success = info.success
+        result.elapsed_ms = info.elapsed_ms
+        result.error = info.error
+        result.codec = info.codec
+        result.resolution = info.resolution
+        result.bandwidth_kbps = info.bitrate_kbps
+        result.ts = info.ts
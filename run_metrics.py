@@ -0,0 +1,148 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from probe_history import percentile
+
+METRICS_FILE = 'metrics.json'  # main.py writes it next to live.txt
+CHECK_METRICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'assets', 'whitelist-blacklist', 'check_metrics.json')
+HISTOGRAM_BOUNDS_MS = (50, 100, 200, 500, 1000, 2000, 5000)  # Upper bounds of the latency buckets
+SLOWEST_HOSTS = 20
+
+
+def latency_histogram(latencies_ms: Iterable[float], bounds=HISTOGRAM_BOUNDS_MS) -> Dict[str, int]:
+    """Counts per latency bucket: "<=50", "<=100", ... and ">" the last bound"""
+    labels = [f"<={bound}" for bound in bounds] + [f">{bounds[-1]}"]
+    counts = dict.fromkeys(labels, 0)
+    for latency in latencies_ms:
+        counts[labels[bisect_left(bounds, latency)]] += 1
+    return counts
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, Any]:
+    ordered = sorted(latencies_ms)
+    if not ordered:
+        return {'count': 0}
+    return {'count': len(ordered), 'p50_ms': round(percentile(ordered, 0.5), 2),
+            'p95_ms': round(percentile(ordered, 0.95), 2), 'max_ms': round(ordered[-1], 2)}
+
+
+def slowest_hosts(latencies_by_host: Dict[str, List[float]], limit: int = SLOWEST_HOSTS) -> List[Dict[str, Any]]:
+    """Hosts with the highest median latency"""
+    summaries = [dict(host=host, **latency_summary(latencies))
+                 for host, latencies in latencies_by_host.items() if latencies]
+    summaries.sort(key=lambda summary: summary['p50_ms'], reverse=True)
+    return summaries[:limit]
+
+
+def probe_outcome(result) -> str:
+    """Outcome class of a ProbeResult, from its error text"""
+    if result.success:
+        return 'ok'
+    error = result.error or ''
+    if error.startswith('unresolvable'):
+        return 'unresolvable'
+    if error.startswith('unreachable'):
+        return 'unreachable'
+    if 'timed out' in error:
+        return 'timeout'
+    return 'error'
+
+
+def probe_metrics(results, host_of) -> Dict[str, Any]:
+    """Probe counts by protocol and outcome, latency histograms and the slowest hosts of a check run"""
+    outcomes: Dict[str, Dict[str, int]] = {}
+    latencies: Dict[str, List[float]] = {}  # Per protocol, successful probes only
+    host_latencies: Dict[str, List[float]] = {}
+    for result in results:
+        counts = outcomes.setdefault(result.protocol, {})
+        outcome = probe_outcome(result)
+        counts[outcome] = counts.get(outcome, 0) + 1
+        if result.success and result.elapsed_ms is not None:
+            latencies.setdefault(result.protocol, []).append(result.elapsed_ms)
+            host_latencies.setdefault(host_of(result.url), []).append(result.elapsed_ms)
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    return {
+        'total': len(results),
+        'by_protocol': outcomes,
+        'hedged': sum(result.hedged for result in results),
+        'reused_connections': sum(result.reused for result in results),
+        'from_cache': sum(result.from_cache for result in results),
+        'latency': latency_summary(all_latencies),
+        'latency_histogram': latency_histogram(all_latencies),
+        'latency_histogram_by_protocol': {protocol: latency_histogram(values)
+                                          for protocol, values in latencies.items()},
+        'slowest_hosts': slowest_hosts(host_latencies),
+    }
+
+
+class RunMetrics:
+    """Wall and CPU time of each phase of a run plus free-form sections, written as one JSON document.
+    CPU time is the whole process's, so it includes any threads working during the phase"""
+
+    def __init__(self):
+        self.started = datetime.now(timezone.utc)
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.sections: Dict[str, Any] = {}
+        self.current: Optional[Tuple[str, float, float]] = None  # Phase started with begin(): name, wall, cpu
+
+    def begin(self, name: str):
+        """Start timing a phase, ending the one begun before it (for straight-line scripts)"""
+        self.end()
+        self.current = (name, time.perf_counter(), time.process_time())
+
+    def end(self):
+        if self.current:
+            name, wall_start, cpu_start = self.current
+            self.current = None
+            self.phases[name] = {'wall_s': round(time.perf_counter() - wall_start, 3),
+                                 'cpu_s': round(time.process_time() - cpu_start, 3)}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def set(self, section: str, value: Any):
+        self.sections[section] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'started_at': self.started.isoformat(timespec='seconds'),
+            'wall_s': round(time.perf_counter() - self.wall_start, 3),
+            'cpu_s': round(time.process_time() - self.cpu_start, 3),
+            'phases': self.phases,
+            **self.sections,
+        }
+
+    def write(self, path: str):
+        try:
+            tmp_file = path + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+            os.replace(tmp_file, path)
+            print(f"Metrics saved to {path}")
+        except Exception as e:
+            print(f"Error saving metrics {path}: {e}")
+
+
+def load_metrics(path: str) -> Any:
+    """A metrics document written by an earlier run, or None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading metrics {path}: {e}")
+        return None
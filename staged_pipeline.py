@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional
+
+QUEUE_SIZE = 64  # Default bound of a stage's input queue
+DONE = object()  # End-of-input marker; each worker puts it back for its siblings
+
+Emit = Callable[[Any], None]
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    queue_size: int  # 0 for stages without an input queue
+    items_in: int = 0
+    items_out: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0  # Summed over workers: time in the stage function, minus time blocked emitting
+    blocked_seconds: float = 0.0  # Summed over workers: time waiting for room in the next stage's queue
+    cpu_seconds: float = 0.0  # Summed over workers: thread CPU time in the stage function
+    wall_seconds: float = 0.0  # First item taken to last worker finished
+    max_depth: int = 0  # Most items seen waiting in the input queue
+    max_pending: int = 0  # Ordered stages: most items held back waiting for an earlier index
+    depth_total: int = 0  # Input queue depth summed over every item taken, for mean_depth
+
+    @property
+    def mean_depth(self) -> float:
+        return self.depth_total / self.items_in if self.items_in else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Items per busy second of one worker"""
+        return self.items_in / self.busy_seconds if self.busy_seconds else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.name}: {self.items_in} in, {self.items_out} out, {self.errors} errors, "
+                f"{self.throughput:.0f}/s busy, {self.busy_seconds:.2f}s busy, {self.cpu_seconds:.2f}s cpu, "
+                f"{self.blocked_seconds:.2f}s blocked, "
+                f"{self.wall_seconds:.2f}s wall, queue {self.mean_depth:.1f} mean / {self.max_depth} max "
+                f"of {self.queue_size} x{self.workers}")
+
+
+class Stage:
+    """One pipeline step: func(item, emit) runs on `workers` threads and calls emit() for each item it
+    passes on. emit() blocks while the next stage's queue is full, so a slow stage throttles the ones
+    before it instead of letting work pile up in memory.
+
+    With ordered=True the items must be (index, ...) tuples numbered from 0; they are handed to func in
+    index order whatever order they arrive in (the stage then needs a single worker). Items fed to the
+    pipeline then carry the same index first, and StagedPipeline.run feeds no item more than `window`
+    indexes ahead of the next one this stage expects, so a slow early item can't make later ones pile up
+    in the reorder buffer. Stages before it must pass every index on (emit a failure item rather than
+    raise), or feeding stalls."""
+
+    def __init__(self, name: str, func: Callable[[Any, Emit], None], workers: int = 1,
+                 queue_size: int = QUEUE_SIZE, ordered: bool = False, window: Optional[int] = None):
+        if ordered and workers != 1:
+            raise ValueError("an ordered stage needs exactly one worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.ordered = ordered
+        self.window = window or queue_size
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stats = StageStats(name, workers, queue_size)
+        self.lock = threading.Lock()
+        self.advanced = threading.Condition(self.lock)  # Ordered stages: notified when next_index moves
+        self.next_index = 0
+        self.running = workers
+        self.started: Optional[float] = None
+
+
+class StagedPipeline:
+    """Stages joined by bounded queues, all running concurrently"""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+
+    def run(self, items: Iterable[Any]) -> List[StageStats]:
+        """Feed items to the first stage and wait until every stage has drained"""
+        threads = [threading.Thread(target=self.worker, args=(position,), name=f"{stage.name}-{n}", daemon=True)
+                   for position, stage in enumerate(self.stages) for n in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+        first = self.stages[0]
+        # An ordered stage past the first one may receive items out of order; keep the feed within its window
+        gate = next((stage for stage in self.stages[1:] if stage.ordered), None)
+        for item in items:
+            if gate is not None:
+                with gate.advanced:
+                    gate.advanced.wait_for(lambda: item[0] < gate.next_index + gate.window)
+            first.queue.put(item)
+        first.queue.put(DONE)
+        for thread in threads:
+            thread.join()
+        return [stage.stats for stage in self.stages]
+
+    def worker(self, position: int):
+        stage = self.stages[position]
+        downstream = self.stages[position + 1] if position + 1 < len(self.stages) else None
+        stats = stage.stats
+        blocked = [0.0]  # This worker's time in emit() during the current item
+
+        def emit(item: Any):
+            if downstream is not None:
+                start = time.perf_counter()
+                downstream.queue.put(item)
+                blocked[0] += time.perf_counter() - start
+            with stage.lock:
+                stats.items_out += 1
+
+        def process(item: Any):
+            blocked[0] = 0.0
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            try:
+                stage.func(item, emit)
+            except Exception as e:
+                with stage.lock:
+                    stats.errors += 1
+                print(f"Error in {stage.name} stage: {e}")
+            elapsed = time.perf_counter() - start
+            cpu = time.thread_time() - cpu_start
+            with stage.lock:
+                stats.cpu_seconds += cpu
+                stats.busy_seconds += elapsed - blocked[0]
+                stats.blocked_seconds += blocked[0]
+
+        pending = {}  # Ordered stages: items that arrived ahead of next_index
+        while True:
+            item = stage.queue.get()
+            if item is DONE:
+                stage.queue.put(DONE)
+                break
+            depth = stage.queue.qsize()
+            with stage.lock:
+                if stage.started is None:
+                    stage.started = time.perf_counter()
+                stats.items_in += 1
+                stats.depth_total += depth
+                stats.max_depth = max(stats.max_depth, depth)
+            if not stage.ordered:
+                process(item)
+                continue
+            pending[item[0]] = item
+            with stage.lock:
+                stats.max_pending = max(stats.max_pending, len(pending) - (stage.next_index in pending))
+            while stage.next_index in pending:
+                process(pending.pop(stage.next_index))
+                with stage.advanced:
+                    stage.next_index += 1
+                    stage.advanced.notify_all()
+        # Indexes that never arrived (an upstream error) must not hold back the ones after them
+        for index in sorted(pending):
+            process(pending[index])
+
+        with stage.lock:
+            stage.running -= 1
+            last = stage.running == 0
+            if last and stage.started is not None:
+                stats.wall_seconds = time.perf_counter() - stage.started
+        if last and downstream is not None:
+            downstream.queue.put(DONE)
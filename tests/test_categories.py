@@ -0,0 +1,42 @@
+"""Every channel main0.py/main1.py file under a category must come out in live.txt or others.txt"""
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def categorized_processor(module_name, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    processor = importlib.import_module(module_name).TVChannelProcessor()
+    processor.build_category_index()
+    processor.ys_dictionary, processor.ws_dictionary = [], []
+    lines = []
+    for i, channel_name in enumerate(processor.category_index):
+        line = f"{channel_name},http://example.com/{i}"
+        lines.append(line)
+        if module_name == 'main1':
+            processor.channel_sources[channel_name] = [(0, line)]
+        else:
+            processor.categorize_channel(channel_name, line)
+    if module_name == 'main1':
+        processor.final_categorization()
+    return processor, lines
+
+
+@pytest.mark.parametrize('module_name', ['main0', 'main1'])
+def test_every_categorized_line_is_written(module_name, monkeypatch, tmp_path):
+    processor, lines = categorized_processor(module_name, monkeypatch)
+    assert set(processor.category_index.values()) - set(processor.lite_categories)
+
+    monkeypatch.chdir(tmp_path)
+    processor.generate_output_files()
+    written = set()
+    for file_name in ('live.txt', 'others.txt'):
+        with open(file_name, 'r', encoding='utf-8') as f:
+            written.update(line.strip() for line in f)
+    missing = [line for line in lines if line not in written]
+    assert not missing, missing[:20]
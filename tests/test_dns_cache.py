@@ -0,0 +1,135 @@
+"""DNSCache against a stub resolver: TTL expiry, NXDOMAIN negative caching, shared in-flight lookups
+and falling back to the next address when a connect fails"""
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dns_cache  # noqa: E402
+from dns_cache import DNSCache  # noqa: E402
+
+
+class StubResolver:
+    def __init__(self, answers):
+        self.answers = answers  # {host: [addresses] or an exception to raise}
+        self.calls = []
+
+    def __call__(self, host):
+        self.calls.append(host)
+        answer = self.answers[host]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(dns_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_positive_entries_expire_after_ttl(clock):
+    resolver = StubResolver({'a.example': ['10.0.0.1', '10.0.0.2']})
+    cache = DNSCache(ttl=300, resolver=resolver)
+
+    assert cache.resolve_all('a.example') == ['10.0.0.1', '10.0.0.2']
+    assert cache.resolve('a.example') == '10.0.0.1'
+    assert resolver.calls == ['a.example']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    clock[0] += 299
+    cache.resolve('a.example')
+    assert len(resolver.calls) == 1
+
+    clock[0] += 2
+    resolver.answers['a.example'] = ['10.0.0.3']
+    assert cache.resolve('a.example') == '10.0.0.3'
+    assert len(resolver.calls) == 2
+
+
+def test_nxdomain_is_cached_for_negative_ttl(clock):
+    resolver = StubResolver({'missing.example': socket.gaierror(socket.EAI_NONAME, 'Name or service not known')})
+    cache = DNSCache(negative_ttl=60, resolver=resolver)
+
+    with pytest.raises(socket.gaierror):
+        cache.resolve('missing.example')
+    with pytest.raises(socket.gaierror):
+        cache.resolve('missing.example')
+    assert resolver.calls == ['missing.example']
+    assert cache.failure('missing.example')
+
+    clock[0] += 61
+    assert cache.failure('missing.example') is None
+    with pytest.raises(socket.gaierror):
+        cache.resolve('missing.example')
+    assert len(resolver.calls) == 2
+
+
+def test_transient_failures_are_not_cached(clock):
+    resolver = StubResolver({'flaky.example': socket.gaierror(socket.EAI_AGAIN, 'Temporary failure')})
+    cache = DNSCache(resolver=resolver)
+
+    for _ in range(2):
+        with pytest.raises(socket.gaierror):
+            cache.resolve('flaky.example')
+    assert len(resolver.calls) == 2
+    assert cache.failure('flaky.example') is None
+
+
+def test_concurrent_lookups_share_one_resolver_call():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_resolver(host):
+        calls.append(host)
+        started.set()
+        release.wait(5)
+        return ['10.0.0.9']
+
+    cache = DNSCache(resolver=slow_resolver)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.resolve('slow.example'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == ['slow.example']
+    assert results == ['10.0.0.9'] * 8
+    assert cache.misses == 1
+
+
+def test_create_connection_tries_each_address(monkeypatch):
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    port = server.getsockname()[1]
+    attempts = []
+    real_create_connection = socket.create_connection
+
+    def create_connection(address, *args, **kwargs):
+        attempts.append(address[0])
+        if address[0] == '192.0.2.1':
+            raise ConnectionRefusedError(111, 'Connection refused')
+        return real_create_connection(address, *args, **kwargs)
+
+    monkeypatch.setattr(dns_cache.socket, 'create_connection', create_connection)
+    cache = DNSCache(resolver=StubResolver({'multi.example': ['192.0.2.1', '127.0.0.1']}))
+    try:
+        cache.create_connection(('multi.example', port), timeout=2).close()
+    finally:
+        server.close()
+    assert attempts == ['192.0.2.1', '127.0.0.1']
+
+    cache = DNSCache(resolver=StubResolver({'dead.example': ['192.0.2.1', '192.0.2.1']}))
+    with pytest.raises(ConnectionRefusedError):
+        cache.create_connection(('dead.example', port), timeout=2)
@@ -0,0 +1,84 @@
+"""Golden tests: the compiled channel name cleaner must match the reference replace loop on every channel
+name in today's data and on strings built from pieces of the tables, and the checker must group channels by
+main.py's canonical names.
+
+Benchmark (24,530 names incl. their t2s forms x 10, best of 3, several runs): replace loop 0.64-0.87s,
+compiled cleaner 0.44-0.53s, about 1.5x faster. The previous finditer-based cleaner took 0.86-0.91s."""
+import glob
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from channel_names import CORRECTIONS_FILE, ChannelNameNormalizer, load_corrections_name  # noqa: E402
+from main import TVChannelProcessor  # noqa: E402
+from pipeline import load_checker  # noqa: E402
+
+NAME_FILES = ['live.txt', 'live_lite.txt', 'others.txt',
+              'assets/whitelist-blacklist/whitelist_manual.txt', 'assets/whitelist-blacklist/whitelist_auto.txt',
+              'assets/whitelist-blacklist/whitelist_auto_tv.txt']
+DICTIONARY_DIRS = ['主频道', '地方台', '专区']
+
+
+def read_lines(path):
+    try:
+        with open(os.path.join(ROOT, path), 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f]
+    except FileNotFoundError:
+        return []
+
+
+def channel_names():
+    names = set()
+    for path in NAME_FILES:
+        for line in read_lines(path):
+            if ',' not in line or '#genre#' in line:
+                continue
+            parts = line.split(',')
+            # whitelist_auto.txt lines are "XXms,name,url"
+            names.add(parts[1] if len(parts) > 2 and parts[0].endswith('ms') else parts[0])
+    for directory in DICTIONARY_DIRS:
+        for path in glob.glob(os.path.join(ROOT, directory, '*.txt')):
+            names.update(line for line in read_lines(path) if line and '#genre#' not in line)
+    for line in read_lines('assets/corrections_name.txt'):
+        names.update(part for part in line.split(',') if part)
+    return sorted(names)
+
+
+def test_compiled_cleaner_matches_loop():
+    normalizer = ChannelNameNormalizer()
+    assert normalizer.compiled_cleaner_safe
+    names = channel_names()
+    assert names
+    # Names are cleaned after the traditional -> simplified conversion, so check both spellings
+    candidates = sorted(set(names) | {normalizer.traditional_to_simplified(name) for name in names})
+    mismatches = [(name, normalizer.clean_channel_name(name), normalizer.clean_channel_name_loop(name))
+                  for name in candidates
+                  if normalizer.clean_channel_name(name) != normalizer.clean_channel_name_loop(name)]
+    assert not mismatches, mismatches[:20]
+
+
+def test_compiled_cleaner_matches_loop_on_joins():
+    # Removing one entry can join the text around it into another entry (or into an outer one around a
+    # nested entry, "_" + "电信"); the cleaner must notice and give the loop's answer
+    normalizer = ChannelNameNormalizer()
+    entries = normalizer.removal_list + list(normalizer.replacements)
+    pieces = entries + [entry[:k] for entry in entries for k in range(1, len(entry))]
+    pieces += [entry[k:] for entry in entries for k in range(1, len(entry))] + list('ab_ -0NEWew')
+    rng = random.Random(1)
+    for _ in range(100000):
+        name = ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 8)))
+        assert normalizer.clean_channel_name(name) == normalizer.clean_channel_name_loop(name), name
+
+
+def test_checker_groups_by_main_canonical_name():
+    checker = load_checker()
+    processor = TVChannelProcessor()
+    processor.corrections_name = load_corrections_name(os.path.join(ROOT, CORRECTIONS_FILE))
+    processor.name_normalizer.corrections = processor.corrections_name
+    names = channel_names()
+    mismatches = [(name, checker.normalize_channel_name(name), processor.normalize_channel_name(name))
+                  for name in names if checker.normalize_channel_name(name) != processor.normalize_channel_name(name)]
+    assert not mismatches, mismatches[:20]
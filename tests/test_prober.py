@@ -0,0 +1,129 @@
+"""ConnectionPool limits, the phase-one connect deadline, and AsyncProber hedging against a local HTTP server
+whose first request is slow"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dns_cache import DNSCache  # noqa: E402
+import prober as prober_module  # noqa: E402
+from prober import POOL_IDLE_TIMEOUT, AsyncProber, ConnectionPool  # noqa: E402
+
+SLOW_S = 0.3
+HEDGE_DELAY_S = 0.05
+
+
+class FakeReader:
+    def at_eof(self):
+        return False
+
+
+class FakeWriter:
+    def __init__(self):
+        self.closed = False
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prober_module.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def endpoint(n):
+    return ('http', f'host{n}.example', 80)
+
+
+def test_pool_closes_least_recently_used_past_max_idle(clock):
+    pool = ConnectionPool(max_per_host=8, max_idle=2)
+    writers = [FakeWriter() for _ in range(3)]
+    for n, writer in enumerate(writers):
+        clock[0] += 1
+        pool.put(endpoint(n), FakeReader(), writer)
+
+    assert [writer.closed for writer in writers] == [True, False, False]
+    assert pool.evicted == 1
+    assert pool.take(endpoint(0)) is None
+    assert pool.take(endpoint(2))[1] is writers[2]
+    assert len(pool.lru) == 1
+
+
+def test_pool_closes_expired_connections_of_other_endpoints(clock):
+    pool = ConnectionPool()
+    stale, fresh = FakeWriter(), FakeWriter()
+    pool.put(endpoint(0), FakeReader(), stale)
+    clock[0] += POOL_IDLE_TIMEOUT
+    # Nothing asks for endpoint 0 again; activity on another endpoint still closes its idle socket
+    pool.put(endpoint(1), FakeReader(), fresh)
+    assert stale.closed and not fresh.closed
+    assert endpoint(0) not in pool.idle
+    assert pool.evicted == 1
+
+
+def test_connect_endpoint_shares_one_deadline_between_resolve_and_connect(monkeypatch):
+    async def slow_open_connection(host, port, **kwargs):
+        await asyncio.sleep(0.2)
+        return FakeReader(), FakeWriter()
+
+    async def slow_resolve(host):
+        await asyncio.sleep(0.2)
+        return ['127.0.0.1']
+
+    async def connect(timeout):
+        prober = AsyncProber(dns=DNSCache(resolver=lambda host: [host]))
+        prober._resolve = slow_resolve
+        return await prober.connect_endpoint(('http', 'slow.example', 80), timeout=timeout)
+
+    monkeypatch.setattr(prober_module.asyncio, 'open_connection', slow_open_connection)
+    # Each step fits in the timeout on its own, both together don't
+    result = asyncio.run(connect(0.3))
+    assert not result.reachable and 'timed out' in result.error
+    result = asyncio.run(connect(1))
+    assert result.reachable and result.connect_ms >= 400
+
+
+async def hedged_probe():
+    requests = []
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                await reader.readuntil(b'\r\n\r\n')
+                requests.append(None)
+                await asyncio.sleep(SLOW_S if len(requests) == 1 else 0)
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    netloc = f"127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    prober = AsyncProber(timeout=3, rate_limit=1000, dns=DNSCache(resolver=lambda host: [host]),
+                         hedge_delays={netloc: HEDGE_DELAY_S}, hedge_budget=1.0)
+    try:
+        return await prober.probe(f"http://{netloc}/live.flv"), prober
+    finally:
+        prober.close()
+        server.close()
+
+
+def test_hedge_win_reports_time_from_the_first_attempt():
+    result, prober = asyncio.run(hedged_probe())
+    assert result.success and result.hedged
+    assert prober.hedge_wins == 1
+    # The caller waited out the hedge delay before the second attempt even started
+    assert result.elapsed_ms >= HEDGE_DELAY_S * 1000
+    assert result.hedge_elapsed_ms < result.elapsed_ms
+    assert result.elapsed_ms < SLOW_S * 1000
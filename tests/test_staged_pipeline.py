@@ -0,0 +1,41 @@
+"""StagedPipeline: an ordered stage keeps index order and bounds its reorder buffer while an early item is slow"""
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from staged_pipeline import Stage, StagedPipeline  # noqa: E402
+
+
+def run_with_slow_head(window, items=40):
+    release = threading.Event()
+    seen = []
+
+    def slow_head(item, emit):
+        if item[0] == 0:
+            release.wait(5)
+        emit(item)
+
+    def ordered(item, emit):
+        seen.append(item[0])
+
+    # Let every other item through before the head finishes
+    threading.Timer(0.3, release.set).start()
+    stats = StagedPipeline([Stage('fetch', slow_head, workers=8),
+                            Stage('normalize', ordered, ordered=True, window=window)]).run(
+        (index, f"url{index}") for index in range(items))
+    return seen, stats[1]
+
+
+def test_reorder_buffer_stays_within_window():
+    seen, stats = run_with_slow_head(window=4)
+    assert seen == list(range(40))
+    assert stats.max_pending <= 3
+
+
+def test_wide_window_lets_later_items_run_ahead():
+    seen, stats = run_with_slow_head(window=1000)
+    assert seen == list(range(40))
+    assert stats.max_pending == 39